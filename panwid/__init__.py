@@ -14,6 +14,8 @@ from . import listbox
 from .listbox import *
 from . import scroll
 from .scroll import *
+from . import search
+from .search import *
 from . import sparkwidgets
 from .sparkwidgets import *
 from . import tabview
@@ -30,6 +32,7 @@ __all__ = (
     + keymap.__all__
     + listbox.__all__
     + scroll.__all__
+    + search.__all__
     + sparkwidgets.__all__
     + tabview.__all__
 )
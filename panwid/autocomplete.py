@@ -1,11 +1,13 @@
 import logging
 logger = logging.getLogger(__name__)
 import itertools
+import bisect
 
 import urwid
 
 from .highlightable import HighlightableTextMixin
 from .keymap import *
+from .search import SearchIndex, FuzzyIndex, unfold_span
 from  urwid_readline import ReadlineEdit
 
 @keymapped()
@@ -96,6 +98,10 @@ class AutoCompleteMixin(object):
     auto_complete = None
     prompt_attr = "dropdown_prompt"
 
+    # subclasses that can provide the label of every position up front
+    # (see complete_labels) get indexed completion instead of a scan
+    complete_labels = None
+
     def __init__(self, auto_complete, prompt_attr=None, *args, **kwargs):
         super().__init__(self.complete_container, *args, **kwargs)
         if auto_complete is not None: self.auto_complete = auto_complete
@@ -104,10 +110,16 @@ class AutoCompleteMixin(object):
         self.auto_complete_bar = None
         self.completing = False
         self.complete_anywhere = False
+        self.complete_fuzzy = False
         self.case_sensitive = False
         self.last_complete_pos = None
         self.complete_string_location = None
         self.last_filter_text = None
+        self._complete_index = None
+        self._complete_index_labels = None
+        self._complete_matches = {}
+        self._fuzzy_index = None
+        self._fuzzy_index_labels = None
 
         if self.auto_complete:
             self.auto_complete_bar = AutoCompleteBar(
@@ -187,13 +199,17 @@ class AutoCompleteMixin(object):
     def complete_substring(self):
         self.complete_on(anywhere=True)
 
+    @keymap_command()
+    def complete_fuzzy(self):
+        self.complete_on(fuzzy=True)
+
     def complete_prev(self):
         self.complete(step=-1)
 
     def complete_next(self):
         self.complete(step=1)
 
-    def complete_on(self, anywhere=False, case_sensitive=False):
+    def complete_on(self, anywhere=False, case_sensitive=False, fuzzy=False):
 
         if self.completing:
             return
@@ -209,6 +225,8 @@ class AutoCompleteMixin(object):
         else:
             self.case_sensitive = False
 
+        self.complete_fuzzy = fuzzy
+
     def complete_compare_substring(self, search, candidate):
         try:
             return candidate.index(search)
@@ -229,15 +247,149 @@ class AutoCompleteMixin(object):
         # return f(candidate)
 
 
+    @property
+    def complete_index(self):
+        labels = self.complete_labels
+        if labels is not self._complete_index_labels:
+            # labels were replaced; rebuild
+            self._complete_index = SearchIndex(enumerate(labels))
+            self._complete_index_labels = labels
+            self._complete_matches.clear()
+        return self._complete_index
+
+    def complete_matches(self, text):
+        # sorted positions whose labels match text.  Results are cached per
+        # filter text, so typing another character only has to narrow the
+        # previous candidates rather than search everything again.
+        index = self.complete_index
+        mode = (self.complete_anywhere, self.case_sensitive)
+        try:
+            return self._complete_matches[(text, mode)]
+        except KeyError:
+            pass
+
+        previous = self._complete_matches.get((text[:-1], mode))
+        if previous is not None:
+            key = text.casefold()
+            if self.complete_anywhere:
+                matches = [ p for p in previous if key in index[p] ]
+            else:
+                matches = [ p for p in previous if index[p].startswith(key) ]
+        else:
+            matches = sorted(index.find(text, anywhere=self.complete_anywhere))
+
+        if self.case_sensitive:
+            labels = self.complete_labels
+            if self.complete_anywhere:
+                matches = [ p for p in matches if text in labels[p] ]
+            else:
+                matches = [ p for p in matches if labels[p].startswith(text) ]
+
+        self._complete_matches[(text, mode)] = matches
+        return matches
+
+    def complete_indexed(self, pos, step):
+
+        matches = self.complete_matches(self.filter_text)
+        if not matches:
+            return (None, None)
+
+        # same order the scan visits positions in: from the focus (or step
+        # positions past it) onwards, wrapping around
+        step = step or 0
+        if step >= 0:
+            i = bisect.bisect_left(matches, pos + step)
+            if i == len(matches):
+                i = 0
+        else:
+            i = bisect.bisect_right(matches, pos + step) - 1
+        pos = matches[i]
+
+        # spans to highlight, in the label rather than its casefolded key,
+        # which can be a different length
+        label = str(self.complete_labels[pos])
+        text = self.filter_text
+        if self.case_sensitive:
+            start = label.index(text) if self.complete_anywhere else 0
+            return (pos, [(start, start + len(text))])
+        key = label.casefold()
+        text = text.casefold()
+        start = key.index(text) if self.complete_anywhere else 0
+        return (pos, [unfold_span(label, start, start + len(text))])
+
+    @property
+    def fuzzy_index(self):
+        labels = self.complete_labels
+        if labels is None:
+            # no labels up front, so take them from the widgets once per
+            # completion session
+            if self._fuzzy_index_labels is not self.complete_body:
+                self._fuzzy_index = FuzzyIndex(
+                    str(self.complete_widget_at_pos(p))
+                    for p in self.complete_body.positions()
+                )
+                self._fuzzy_index_labels = self.complete_body
+        elif labels is not self._fuzzy_index_labels:
+            self._fuzzy_index = FuzzyIndex(labels)
+            self._fuzzy_index_labels = labels
+        return self._fuzzy_index
+
+    def complete_fuzzy_search(self, step):
+
+        index = self.fuzzy_index
+        ranking = index.search(self.filter_text)
+        if not ranking:
+            return (None, None)
+
+        # best match first; next/prev walk down and up the ranking
+        i = 0
+        if step and self.last_complete_pos in ranking:
+            i = (ranking.index(self.last_complete_pos) + step) % len(ranking)
+        pos = ranking[i]
+
+        spans = []
+        for p in index.positions(pos, self.filter_text):
+            if spans and spans[-1][1] == p:
+                spans[-1][1] = p+1
+            else:
+                spans.append([p, p+1])
+        return (pos, [tuple(span) for span in spans])
+
+    def complete_scan(self, pos, step):
+
+        positions = itertools.cycle(
+            self.complete_body.positions(reverse=(step and step < 0))
+        )
+        initial_pos = pos
+        pos = next(positions)
+        while pos != initial_pos:
+            pos = next(positions)
+        for i in range(abs(step or 0)):
+            pos = next(positions)
+
+        while True:
+            widget = self.complete_widget_at_pos(pos)
+            complete_index = self.complete_compare_fn(self.filter_text, str(widget))
+            if complete_index is not None:
+                return (pos, complete_index)
+            pos = next(positions)
+            if pos == initial_pos:
+                return (None, None)
+
     @keymap_command()
     def complete_off(self):
 
         if not self.completing:
             return
+        self.completing = False
         self.filter_text = ""
+        self._complete_matches.clear()
+        if self._fuzzy_index is not None:
+            self._fuzzy_index.clear()
+        if self.complete_labels is None:
+            self._fuzzy_index = self._fuzzy_index_labels = None
 
         self.hide_bar()
-        self.completing = False
 
     @keymap_command
     def complete(self, step=None, no_wrap=False):
@@ -250,37 +402,32 @@ class AutoCompleteMixin(object):
 
         # logger.info(f"complete: {self.filter_text}")
 
-        if self.last_complete_pos:
-            widget = self.complete_widget_at_pos(self.last_complete_pos)
+        if self.last_complete_pos is not None:
+            try:
+                widget = self.complete_widget_at_pos(self.last_complete_pos)
+            except IndexError:
+                widget = None
             if isinstance(widget, HighlightableTextMixin):
                 widget.unhighlight()
 
         self.initial_pos = self.complete_body.get_focus()[1]
-        positions = itertools.cycle(
-            self.complete_body.positions(reverse=(step and step < 0))
-        )
-        pos = next(positions)
-        # logger.info(pos.get_value())
-        # import ipdb; ipdb.set_trace()
-        while pos != self.initial_pos:
-            # logger.info(pos.get_value())
-            pos = next(positions)
-        for i in range(abs(step or 0)):
-            # logger.info(pos.get_value())
-            pos = next(positions)
+        if self.initial_pos is None:
+            return
+        if self.complete_fuzzy:
+            pos, spans = self.complete_fuzzy_search(step)
+        elif self.complete_labels is not None:
+            pos, spans = self.complete_indexed(self.initial_pos, step)
+        else:
+            pos, complete_index = self.complete_scan(self.initial_pos, step)
+            if pos is not None:
+                spans = [(complete_index, complete_index+len(self.filter_text))]
 
-        while True:
+        if pos is not None:
             widget = self.complete_widget_at_pos(pos)
-            complete_index = self.complete_compare_fn(self.filter_text, str(widget))
-            if complete_index is not None:
-                self.last_complete_pos = pos
-                if isinstance(widget, HighlightableTextMixin):
-                    widget.highlight(complete_index, complete_index+len(self.filter_text))
-                self.complete_set_focus(pos)
-                break
-            pos = next(positions)
-            if pos == self.initial_pos:
-                break
+            self.last_complete_pos = pos
+            if isinstance(widget, HighlightableTextMixin):
+                widget.highlight_spans(spans)
+            self.complete_set_focus(pos)
 
         # logger.info("done")
         self.last_filter_text = self.filter_text
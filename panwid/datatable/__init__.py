@@ -2,6 +2,11 @@ from .datatable import *
 from .dataframe import *
 from .columns import *
 from .common import *
+from .storage import *
+from .filters import *
+from .stats import *
+from .search import *
+from .groups import *
 
 __all__ = """
 DataTable
@@ -9,4 +14,10 @@ DataTableColumn
 DataTableDivider
 DataTableText
 DataTableDataFrame
+DataTableSnapshot
+DataTableFilter
+DataTableStats
+DataTableStatsView
+DataTableSearchIndex
+DataTableGroup
 """.split()
@@ -10,6 +10,16 @@ class DataTableCell(urwid.WidgetWrap):
 
     ATTR = "table_cell"
 
+    # defaults live on the class so that cells, of which there are rows x
+    # columns, only carry the attributes that differ from them
+    fill = False
+    value_attr = None
+    cell_selection = False
+    padding = 0
+    contents_rows = None
+    _width = None
+    _height = None
+
     def __init__(self, table, column, row,
                  fill=False,
                  value_attr=None,
@@ -22,25 +32,18 @@ class DataTableCell(urwid.WidgetWrap):
         self.column = column
         self.row = row
 
-        self.fill = fill
-        self.value_attr = value_attr
-        self.cell_selection = cell_selection
-
-        self.attr = self.ATTR
-        self.attr_focused = "%s focused" %(self.attr)
-        self.attr_column_focused = "%s column_focused" %(self.attr)
-        self.attr_highlight = "%s highlight" %(self.attr)
-        self.attr_highlight_focused = "%s focused" %(self.attr_highlight)
-        self.attr_highlight_column_focused = "%s column_focused" %(self.attr_highlight)
+        if fill:
+            self.fill = fill
+        if value_attr is not None:
+            self.value_attr = value_attr
+        if cell_selection:
+            self.cell_selection = cell_selection
 
-        self._width = None
-        self._height = None
-        self.contents_rows = None
         # self.width = None
 
         if column.padding:
             self.padding = column.padding
-        else:
+        elif padding:
             self.padding = padding
 
         self.update_contents()
@@ -50,29 +53,67 @@ class DataTableCell(urwid.WidgetWrap):
 
         # self.filler = urwid.Filler(self.contents)
 
-        self.normal_attr_map = {}
-        self.highlight_attr_map = {}
-
-        self.normal_focus_map = {}
-        self.highlight_focus_map = {}
-        self.highlight_column_focus_map = {}
-
-        self.set_attr_maps()
-
-        self.highlight_attr_map.update(self.table.highlight_map)
-        self.highlight_focus_map.update(self.table.highlight_focus_map)
+        self._attr_maps = self.table.shared_attr_maps(
+            (self.__class__, self.value_attr, self.cell_selection),
+            self.make_attr_maps
+        )
 
-        self.attrmap = urwid.AttrMap(
-            # self.filler,
-            urwid.Filler(self.contents) if "flow" in self.contents.sizing() else self.contents,
-            attr_map = self.normal_attr_map,
-            focus_map = self.normal_focus_map
+        super(DataTableCell, self).__init__(
+            urwid.AttrMap(
+                # self.filler,
+                urwid.Filler(self.contents) if "flow" in self.contents.sizing() else self.contents,
+                attr_map = self.normal_attr_map,
+                focus_map = self.normal_focus_map
+            )
         )
-        super(DataTableCell, self).__init__(self.attrmap)
 
     def __repr__(self):
         return f"<{self.__class__.__name__}: {self.column.name}>"
 
+    @property
+    def attrmap(self):
+        return self._wrapped_widget
+
+    @property
+    def normal_attr_map(self):
+        return self._attr_maps[0]
+
+    @property
+    def highlight_attr_map(self):
+        return self._attr_maps[1]
+
+    @property
+    def normal_focus_map(self):
+        return self._attr_maps[2]
+
+    @property
+    def highlight_focus_map(self):
+        return self._attr_maps[3]
+
+    @property
+    def attr(self):
+        return self.ATTR
+
+    @property
+    def attr_focused(self):
+        return "%s focused" %(self.attr)
+
+    @property
+    def attr_column_focused(self):
+        return "%s column_focused" %(self.attr)
+
+    @property
+    def attr_highlight(self):
+        return "%s highlight" %(self.attr)
+
+    @property
+    def attr_highlight_focused(self):
+        return "%s focused" %(self.attr_highlight)
+
+    @property
+    def attr_highlight_column_focused(self):
+        return "%s column_focused" %(self.attr_highlight)
+
     @property
     def value(self):
         if self.column.value_fn:
@@ -83,39 +124,44 @@ class DataTableCell(urwid.WidgetWrap):
 
     @value.setter
     def value(self, value):
-        self.table.df[self.row.index, self.column.name] = value
+        # through the row, so search indexes and groups see the change
+        self.row[self.column.name] = value
 
     @property
     def formatted_value(self):
 
-        v = self.column._format(self.value)
         if not self.width:
-            return v
-        # try:
-        v = str(v)[:self.width-self.padding*2]
-        # logger.info(f"formatted_value: {v}")
-        return v
-        # except TypeError:
-            # raise Exception(f"{v}, {type(v)}")
+            return self.column.format_value(self.value)
+        return self.column.format_value(
+            self.value, self.width-self.padding*2
+        )
 
     def update_contents(self):
         pass
 
-    def set_attr_maps(self):
+    def make_attr_maps(self):
 
-        self.normal_attr_map[None] = self.attr
-        self.highlight_attr_map [None] = self.attr_highlight
-        self.normal_focus_map[None] = self.attr_focused
-        self.highlight_focus_map[None] = self.attr_highlight_focused
+        # called once per (cell class, value_attr, cell_selection); the
+        # resulting maps are shared by all matching cells, so they must not
+        # be modified in place
+        normal_attr_map = {None: self.attr}
+        highlight_attr_map = {None: self.attr_highlight}
+        normal_focus_map = {None: self.attr_focused}
+        highlight_focus_map = {None: self.attr_highlight_focused}
 
         if self.value_attr:
-            self.normal_attr_map.update({None: self.value_attr})
-            self.normal_focus_map.update({None: "%s focused" %(self.value_attr)})
-            self.highlight_attr_map.update({None: "%s highlight" %(self.value_attr)})
+            normal_attr_map[None] = self.value_attr
+            normal_focus_map[None] = "%s focused" %(self.value_attr)
+            highlight_attr_map[None] = "%s highlight" %(self.value_attr)
             if self.cell_selection:
-                self.highlight_focus_map.update({None: "%s highlight column_focused" %(self.value_attr)})
+                highlight_focus_map[None] = "%s highlight column_focused" %(self.value_attr)
             else:
-                self.highlight_focus_map.update({None: "%s highlight focused" %(self.value_attr)})
+                highlight_focus_map[None] = "%s highlight focused" %(self.value_attr)
+
+        highlight_attr_map.update(self.table.highlight_map)
+        highlight_focus_map.update(self.table.highlight_focus_map)
+        return (normal_attr_map, highlight_attr_map,
+                normal_focus_map, highlight_focus_map)
 
     def highlight(self):
         self.attrmap.set_attr_map(self.highlight_attr_map)
@@ -150,6 +196,8 @@ class DataTableCell(urwid.WidgetWrap):
             urwid.emit_signal(self, "click")
 
     def set_attr(self, attr):
+        # get_attr_map/get_focus_map return copies, so the shared maps
+        # aren't affected
         attr_map = self.attrmap.get_attr_map()
         attr_map[None] = attr
         # self.attrmap.set_attr_map(attr_map)
@@ -175,7 +223,7 @@ class DataTableCell(urwid.WidgetWrap):
             self._height = maxrow
         else:
             self.contents_rows = self.contents.rows(size, focus)
-            self._height = contents_rows
+            self._height = self.contents_rows
 
         if getattr(self.column, "truncate", None):
             rows = self.inner_contents.pack((self.width,))[1]
@@ -351,13 +399,15 @@ class DataTableHeaderCell(DataTableCell):
         # )
         self.update_sort(self.table.sort_by)
 
-    def set_attr_maps(self):
+    def make_attr_maps(self):
 
-        self.normal_attr_map[None] = self.attr
-        self.highlight_attr_map [None] = self.attr_highlight
+        highlight_attr_map = {None: self.attr_highlight}
+        highlight_focus_map = {None: self.attr_highlight_column_focused}
+        highlight_attr_map.update(self.table.highlight_map)
+        highlight_focus_map.update(self.table.highlight_focus_map)
         # if self.cell_selection:
-        self.normal_focus_map[None] = self.attr_column_focused
-        self.highlight_focus_map[None] = self.attr_highlight_column_focused
+        return ({None: self.attr}, highlight_attr_map,
+                {None: self.attr_column_focused}, highlight_focus_map)
 
     def selectable(self):
         return self.table.ui_sort
@@ -434,3 +484,25 @@ class DataTableFooterCell(DataTableCell):
 class DataTableDividerFooterCell(DataTableDividerCell, DataTableHeaderCell):
 
     DIVIDER_ATTR = "table_divider_footer"
+
+
+class DataTableGroupCell(DataTableBodyCell):
+
+    ATTR = "table_row_group"
+
+    @property
+    def value(self):
+        return self.row.group_value(self.column)
+
+    @property
+    def formatted_value(self):
+        value = self.value
+        if value is None:
+            return ""
+        if self.column.name == self.row.label_column:
+            return value
+        return self.column.format_value(value)
+
+
+class DataTableDividerGroupCell(DataTableDividerCell, DataTableGroupCell):
+    pass
@@ -16,7 +16,7 @@ def make_value_function(template):
             data=row,
             row=pos+1,
             rows_loaded = len(table),
-            rows_total = table.query_result_count() if table.limit else "?"
+            rows_total = table.row_count() if table.limit else "?"
         )
 
     return inner
@@ -24,39 +24,33 @@ def make_value_function(template):
 class DataTableBaseColumn(object):
 
     _width = ("weight", 1)
+    padding = DEFAULT_CELL_PADDING
+    hide = False
+    attr = None
 
     def __init__(
             self,
-            padding = DEFAULT_CELL_PADDING,
-            hide=False,
+            padding = None,
+            hide=None,
             width=None,
             min_width=None,
             attr = None
 
     ):
-        self.hide = hide
-        self.padding = padding
-
-        if isinstance(self.padding, tuple):
-            self.padding_left, self.padding_right = self.padding
-        else:
-            self.padding_left = self.padding_right = self.padding
-
+        if hide is not None: self.hide = hide
+        if padding is not None: self.padding = padding
         if width is not None:  self._width = width
         self.min_width = min_width
-        self.attr = attr
+        if attr is not None: self.attr = attr
 
         if isinstance(self._width, tuple):
             if self._width[0] != "weight":
                 raise Exception(
                     "Column width %s not supported" %(self._width[0])
                 )
-            self.initial_sizing, self.initial_width = self._width
             self.min_width = 3 # FIXME
         elif isinstance(self._width, int):
-            self.initial_sizing = "given"
-            self.initial_width = self._width
-            self.min_width = self.initial_width = self._width # assume starting width is minimum
+            self.min_width = self._width # assume starting width is minimum
 
         else:
             raise Exception(self._width)
@@ -64,6 +58,22 @@ class DataTableBaseColumn(object):
         self.sizing = self.initial_sizing
         self.width = self.initial_width
 
+    @property
+    def initial_sizing(self):
+        return self._width[0] if isinstance(self._width, tuple) else "given"
+
+    @property
+    def initial_width(self):
+        return self._width[1] if isinstance(self._width, tuple) else self._width
+
+    @property
+    def padding_left(self):
+        return self.padding[0] if isinstance(self.padding, tuple) else self.padding
+
+    @property
+    def padding_right(self):
+        return self.padding[1] if isinstance(self.padding, tuple) else self.padding
+
     def __repr__(self):
         return f"<{self.__class__.__name__}: {self.name} ({self.width}, {self.sizing})>"
 
@@ -88,18 +98,41 @@ class DataTableBaseColumn(object):
 
 class DataTableColumn(DataTableBaseColumn):
 
+    FORMAT_CACHE_SIZE = 10000
+
+    # there can be many columns, so options left at their defaults are read
+    # from the class rather than stored on every instance
+    value_fn = None
+    align = "left"
+    wrap = "space"
+    pack = False
+    no_clip_header = False
+    truncate = False
+    format_cache = True
+    _format_fn = None
+    decoration_fn = None
+    sort_key = None
+    sort_reverse = False
+    sort_icon = None
+    footer_fn = None
+    footer_arg = "values"
+    # converts values read from text, e.g. by DataTable.import_rows
+    type = None
+
     def __init__(self, name,
                  label=None,
                  value=None,
-                 align="left", wrap="space",
-                 pack=False,
-                 no_clip_header = False,
-                 truncate=False,
+                 align=None, wrap=None,
+                 pack=None,
+                 no_clip_header = None,
+                 truncate=None,
                  format_fn=None,
+                 format_cache=None,
                  decoration_fn=None,
-                 sort_key = None, sort_reverse=False,
+                 sort_key = None, sort_reverse=None,
                  sort_icon = None,
-                 footer_fn = None, footer_arg = "values", **kwargs):
+                 footer_fn = None, footer_arg = None,
+                 type = None, **kwargs):
 
         super().__init__(**kwargs)
         self.name = name
@@ -109,20 +142,21 @@ class DataTableColumn(DataTableBaseColumn):
                 self.value_fn = make_value_function(value)
             elif callable(value):
                 self.value_fn = value
-        else:
-            self.value_fn = None
-        self.align = align
-        self.pack = pack
-        self.wrap = wrap
-        self.no_clip_header = no_clip_header
-        self.truncate = truncate
-        self.format_fn = format_fn
-        self.decoration_fn = decoration_fn
-        self.sort_key = sort_key
-        self.sort_reverse = sort_reverse
-        self.sort_icon = sort_icon
-        self.footer_fn = footer_fn
-        self.footer_arg = footer_arg
+        if align is not None: self.align = align
+        if pack is not None: self.pack = pack
+        if wrap is not None: self.wrap = wrap
+        if no_clip_header is not None: self.no_clip_header = no_clip_header
+        if truncate is not None: self.truncate = truncate
+        if format_cache is not None: self.format_cache = format_cache
+        self._format_cache = {}
+        if format_fn is not None: self.format_fn = format_fn
+        if decoration_fn is not None: self.decoration_fn = decoration_fn
+        if sort_key is not None: self.sort_key = sort_key
+        if sort_reverse is not None: self.sort_reverse = sort_reverse
+        if sort_icon is not None: self.sort_icon = sort_icon
+        if footer_fn is not None: self.footer_fn = footer_fn
+        if footer_arg is not None: self.footer_arg = footer_arg
+        if type is not None: self.type = type
         logger.debug(f"column {self.name}, width: {self.sizing}, {self.width}")
 
 
@@ -136,13 +170,21 @@ class DataTableColumn(DataTableBaseColumn):
             raise Exception(self.name, [ c.name for c in self.table.visible_columns])
         # logger.info(f"len: {len(self.table.body)}")
 
+        if self.value_fn:
+            values = [ r.cells[index].value for r in (self.table.body) ]
+        else:
+            # read values straight from the dataframe rather than building
+            # a row widget for every row in the table
+            df = self.table.df
+            values = [ df.get_cell(i, self.name) for i in self.table._ungrouped_rows ]
+
         l = [
             (
-             getattr(r.cells[index].value, "min_width", None)
+             getattr(v, "min_width", None)
              or
-             len(str(r.cells[index].formatted_value))
+             len(str(self.format_value(v)))
             ) + self.padding*2
-            for r in (self.table.body)
+            for v in values
         ] + [self.table.header.cells[index].min_width or 0] + [self.min_width or 0]
         return max(l)
 
@@ -156,6 +198,49 @@ class DataTableColumn(DataTableBaseColumn):
             return self.min_width or len(self.label) + self.padding_left + self.padding_right + (1 if self.sort_icon else 0)
 
 
+    @property
+    def format_fn(self):
+        return self._format_fn
+
+    @format_fn.setter
+    def format_fn(self, value):
+        self._format_fn = value
+        self.clear_format_cache()
+
+    def clear_format_cache(self):
+        self._format_cache.clear()
+
+    def format_value(self, v, width=None):
+
+        if not self.format_cache:
+            return self._format_width(v, width)
+        # the type is part of the key so that e.g. 1, 1.0 and True, which
+        # compare equal, don't share a formatted string
+        key = (type(v), v, width)
+        try:
+            return self._format_cache[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable values are never cached
+            return self._format_width(v, width)
+
+        s = self._format_width(v, width)
+        # only strings are cached: widgets and markup can't be shared between
+        # cells.  Repeated values (status names, etc.) all get the same string
+        # object back, so the cache doubles as an interning table.
+        if isinstance(s, str):
+            if len(self._format_cache) >= self.FORMAT_CACHE_SIZE:
+                self._format_cache.clear()
+            self._format_cache[key] = s
+        return s
+
+    def _format_width(self, v, width=None):
+        v = self._format(v)
+        if width is None:
+            return v
+        return str(v)[:width]
+
     def _format(self, v):
 
         # First, call the format function for the column, if there is one
@@ -203,8 +288,10 @@ class DataTableDivider(DataTableBaseColumn):
     @property
     def value(self):
         # FIXME: should use SolidFill for rows that span multiple screen rows
-        w = urwid.Divider(self.char)
-        return w
+        # Dividers are stateless, so every row's divider cell can share one
+        if getattr(self, "_divider", None) is None or self._divider.div_char != self.char:
+            self._divider = urwid.Divider(self.char)
+        return self._divider
 
     @property
     def contents_width(self):
@@ -3,10 +3,17 @@ logger = logging.getLogger("panwid.datatable")
 import raccoon as rc
 import collections
 
+from .stats import timed
+
 class DataTableDataFrame(rc.DataFrame):
 
     DATA_TABLE_COLUMNS = ["_dirty", "_focus_position", "_value_fn", "_cls", "_details", "_rendered_row"]
 
+    stats = None
+
+    _index_positions = {}
+    _column_positions = {}
+
     def __init__(self, data=None, columns=None, index=None, index_name="index", sort=None):
 
         self.sidecar_columns = []
@@ -34,6 +41,89 @@ class DataTableDataFrame(rc.DataFrame):
             raise
 
 
+    def index_position(self, index):
+        # Cached index value -> position map.  A cached position is only
+        # trusted if it still holds that index value, so any sort, insert or
+        # delete just causes one rebuild on the next lookup.
+        try:
+            i = self._index_positions[index]
+            if self._index[i] == index:
+                return i
+        except (KeyError, IndexError, TypeError):
+            pass
+        self._index_positions = { x: i for i, x in enumerate(self._index) }
+        try:
+            return self._index_positions[index]
+        except (KeyError, TypeError):
+            raise ValueError("%s is not in index" %(index,))
+
+    def column_position(self, column):
+        try:
+            c = self._column_positions[column]
+            if self._columns[c] == column:
+                return c
+        except (KeyError, IndexError, TypeError):
+            pass
+        self._column_positions = { x: i for i, x in enumerate(self._columns) }
+        try:
+            return self._column_positions[column]
+        except (KeyError, TypeError):
+            raise ValueError("%s is not in columns" %(column,))
+
+    def get_cell(self, index, column):
+        return self._data[self.column_position(column)][self.index_position(index)]
+
+    def set_cell(self, index, column, value):
+        try:
+            self._data[self.column_position(column)][self.index_position(index)] = value
+        except ValueError:
+            # new row or column
+            super(DataTableDataFrame, self).set_cell(index, column, value)
+
+    def get_columns(self, index, columns=None, as_dict=False, **kwargs):
+        if kwargs.get("as_namedtuple") or self._sort:
+            return super(DataTableDataFrame, self).get_columns(
+                index, columns, as_dict=as_dict, **kwargs
+            )
+        return self.get_location(
+            self.index_position(index), columns=columns, as_dict=as_dict,
+            index=kwargs.get("include_index", True)
+        )
+
+    def set_column(self, index=None, column=None, values=None):
+        if (not index or self._sort
+            or (isinstance(index[0], bool) and all(isinstance(i, bool) for i in index))):
+            return super(DataTableDataFrame, self).set_column(index, column, values)
+
+        if not self._check_list(values):
+            values = [values for _ in index]
+        if len(values) != len(index):
+            raise ValueError("length of values and index must be the same.")
+        try:
+            c = self.column_position(column)
+        except ValueError:
+            c = len(self._columns)
+            self._add_column(column)
+        try:
+            indexes = [self.index_position(x) for x in index]
+        except ValueError:
+            self._add_missing_rows(index)
+            indexes = [self.index_position(x) for x in index]
+        data = self._data[c]
+        for x, i in enumerate(indexes):
+            data[i] = values[x]
+
+    def delete_rows(self, indexes):
+        indexes = [indexes] if not self._check_list(indexes) else indexes
+        if (indexes and not self._sort
+            and not all(isinstance(i, bool) for i in indexes)):
+            positions = set(self.index_position(x) for x in indexes)
+            indexes = [ i in positions for i in range(len(self._index)) ]
+        super(DataTableDataFrame, self).delete_rows(indexes)
+
+    def get_row_view(self, index):
+        return DataTableRowView(self, index)
+
     def log_dump(self, n=5, columns=None, label=None):
         df = self
         if columns:
@@ -113,7 +203,8 @@ class DataTableDataFrame(rc.DataFrame):
         if not len(rows):
             return []
 
-        data = self.transpose_data(rows, with_sidecar = with_sidecar)
+        with timed(self.stats, "transpose_data"):
+            data = self.transpose_data(rows, with_sidecar = with_sidecar)
         # data["_details"] = [{"open": False, "disabled": False}] * len(rows)
         data["_cls"] = [type(rows[0][0] if with_sidecar else rows[0])] * len(rows) # all rows assumed to have same class
 
@@ -197,3 +288,40 @@ class DataTableDataFrame(rc.DataFrame):
     def clear(self):
         self.delete_all_rows()
         # self.delete_rows(self.index)
+
+
+class DataTableRowView(collections.abc.Mapping):
+
+    # Read-only mapping over one row of a DataTableDataFrame.  Values are read
+    # straight from the column lists, so nothing is copied up front.
+
+    __slots__ = ["df", "index"]
+
+    def __init__(self, df, index):
+        self.df = df
+        self.index = index
+
+    def __getitem__(self, column):
+        if column == self.df.index_name:
+            return self.index
+        try:
+            return self.df.get_cell(self.index, column)
+        except ValueError:
+            raise KeyError(column)
+
+    def __getattr__(self, attr):
+        if attr in self.__slots__:
+            raise AttributeError(attr)
+        try:
+            return self[attr]
+        except KeyError:
+            raise AttributeError(attr)
+
+    def __iter__(self):
+        return iter(self.df.columns)
+
+    def __len__(self):
+        return len(self.df.columns)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}: {self.index}>"
@@ -1,14 +1,21 @@
 import logging
 logger = logging.getLogger("panwid.datable")
+import os
+import json
+import time
+import asyncio
 import urwid
 import urwid_utils.palette
 from ..listbox import ScrollingListBox
+from ..autocomplete import AutoCompleteBar
 from orderedattrdict import AttrDict
 from collections.abc import MutableMapping
 import itertools
+import inspect
 import copy
 import traceback
 import math
+from collections import OrderedDict
 from dataclasses import *
 import typing
 
@@ -30,6 +37,13 @@ from .dataframe import *
 from .rows import *
 from .columns import *
 from .common import *
+from .storage import *
+from .storage import stream_format
+from .filters import *
+from .stats import *
+from .stats import timed
+from .search import *
+from .groups import *
 
 
 DEFAULT_TABLE_DIVIDER = DataTableDivider(" ")
@@ -45,7 +59,7 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
 
 
     signals = ["select", "refresh", "focus", "blur", "end", "requery",
-               "drag_start", "drag_continue", "drag_stop"]
+               "drag_start", "drag_continue", "drag_stop", "stats"]
 
     ATTR = "table"
 
@@ -55,6 +69,7 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
 
     limit = None
     index = "index"
+    row_count_ttl = None
 
     with_header = True
     with_footer = False
@@ -65,6 +80,7 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
 
     sort_by = (None, None)
     query_sort = False
+    query_filter = False
     sort_icons = True
     sort_refocus = False
     no_load_on_init = None
@@ -78,12 +94,22 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
     detail_replace = None
     detail_auto_open = False
     detail_hanging_indent = None
+    detail_async = False
+    detail_delay = None
+    detail_cache_size = None
+    detail_placeholder = "..."
+    detail_error = "(error loading details)"
+    search_key = None
+    search_prompt_attr = "table_message"
+    group_by = None
+    group_aggregates = None
 
     ui_sort = True
     ui_resize = True
-    row_attr_fn = lambda self, position, data, row: ""
+    row_attr_fn = None
 
     with_sidecar = False
+    with_stats = False
 
     attr_map = {}
     focus_map = {}
@@ -97,21 +123,28 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
                  data=None,
                  limit=None,
                  index=None,
+                 row_count_ttl=None,
                  with_header=None, with_footer=None, with_scrollbar=None,
                  empty_message=None,
                  row_height=None,
                  cell_selection=None,
                  sort_by=None, query_sort=None, sort_icons=None,
                  sort_refocus=None,
+                 query_filter=None,
                  no_load_on_init=None,
                  divider=None, padding=None,
                  row_style=None,
                  detail_fn=None, detail_selectable=None, detail_replace=None,
                  detail_auto_open=None, detail_hanging_indent=None,
+                 detail_async=None, detail_delay=None, detail_cache_size=None,
+                 detail_placeholder=None, detail_error=None,
+                 search_key=None,
+                 group_by=None, group_aggregates=None,
                  ui_sort=None,
                  ui_resize=None,
                  row_attr_fn=None,
-                 with_sidecar=None):
+                 with_sidecar=None,
+                 with_stats=None):
 
         self._focus = 0
         self.page = 0
@@ -135,6 +168,7 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
             self.data = data
 
         if query_sort: self.query_sort = query_sort
+        if query_filter: self.query_filter = query_filter
 
         if sort_by:
             if isinstance(sort_by, tuple):
@@ -182,23 +216,53 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
         if detail_replace is not None: self.detail_replace = detail_replace
         if detail_auto_open is not None: self.detail_auto_open = detail_auto_open
         if detail_hanging_indent is not None: self.detail_hanging_indent = detail_hanging_indent
-        if detail_hanging_indent is not None: self.detail_hanging_indent = detail_hanging_indent
-        if detail_hanging_indent is not None: self.detail_hanging_indent = detail_hanging_indent
-        if detail_hanging_indent is not None: self.detail_hanging_indent = detail_hanging_indent
+        if detail_async is not None: self.detail_async = detail_async
+        if detail_delay is not None: self.detail_delay = detail_delay
+        if detail_cache_size is not None: self.detail_cache_size = detail_cache_size
+        if detail_placeholder is not None: self.detail_placeholder = detail_placeholder
+        if detail_error is not None: self.detail_error = detail_error
+        if search_key is not None: self.search_key = search_key
+        if group_by is not None: self.group_by = group_by
+        if isinstance(self.group_by, str):
+            self.group_by = [self.group_by]
+        if group_aggregates is not None: self.group_aggregates = group_aggregates
 
         if with_sidecar is not None: self.with_sidecar = with_sidecar
+        if with_stats is not None: self.with_stats = with_stats
+        self.stats = DataTableStats() if self.with_stats else None
 
         if limit:
             self.limit = limit
+        if row_count_ttl is not None: self.row_count_ttl = row_count_ttl
 
         self.sort_column = None
         self._width = None
+        self._layout_version = 0
+        self._attr_maps = {}
+        self._width_version = 0
         self._height = None
         self._initialized = False
         self._message_showing = False
         self.pagination_cursor = None
+        self.pagination_cursor_index = None
         self.filters = None
         self.filtered_rows = list()
+        self._ungrouped_rows = self.filtered_rows
+        self.groups = OrderedDict()
+        self._group_keys = {}
+        self._filtered_positions = {}
+        self._row_object_classes = {}
+        self.snapshot = None
+        self._row_count = None
+        self._row_count_time = None
+        self._row_count_task = None
+        self.row_count_estimated = False
+        self._detail_cache = OrderedDict()
+        self._detail_tasks = {}
+        self._detail_open_handle = None
+        self._search_indexes = {}
+        self.search_bar = None
+        self.search_anywhere = False
 
         if self.divider:
             self._columns = list(intersperse_divider(self._columns, self.divider))
@@ -220,11 +284,13 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
             sort=False,
             index_name = self.index or None
         )
+        self.df.stats = self.stats
         self.pile = urwid.Pile([])
         self.listbox = ScrollingListBox(
             self, infinite=self.limit,
             with_scrollbar = self.with_scrollbar,
-            row_count_fn = self.row_count
+            row_count_fn = self.row_count,
+            coalesce_movement = True
         )
         urwid.connect_signal(
             self.listbox, "drag_start",
@@ -308,9 +374,24 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
 
 
     def query(self, sort=None, offset=None):
+        # If query_filter is set, also receives filters: a list of
+        # DataTableFilter objects (or None) to be applied by the data source.
+        # When paginating, cursor is the sort column value of the last loaded
+        # row, for keyset pagination, and cursor_index is its index value, to
+        # break ties between rows with the same sort value.  cursor_index is
+        # only passed to query methods that accept it.
         raise Exception("query method must be overriden")
 
+    def query_accepts(self, name):
+        parameters = inspect.signature(self.query).parameters
+        return name in parameters or any(
+            p.kind == inspect.Parameter.VAR_KEYWORD for p in parameters.values()
+        )
+
     def query_result_count(self):
+        # receives filters=... if query_filter is set.  May be a coroutine
+        # function, in which case the count is computed in the background and
+        # row_count() returns an estimate until it completes.
         raise Exception("query_result_count method must be defined")
 
     @classmethod
@@ -376,7 +457,7 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
             "highlight column_focused": ["white", "g70"],
         }
 
-        for prefix in ["table_row_header", "table_row_footer"]:
+        for prefix in ["table_row_header", "table_row_footer", "table_row_group"]:
             for suffix in [
                     None, "focused", "column_focused",
                     "highlight", "highlight focused",
@@ -544,7 +625,10 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
         self._focus = position
         if self.selection and self.detail_auto_open:
             # logger.info(f"datatable open details: {self._focus}, {position}")
-            self.selection.open_details()
+            if self.detail_delay:
+                self.schedule_open_details()
+            else:
+                self.selection.open_details()
         self._emit("focus", position)
         self._modified()
 
@@ -634,7 +718,17 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
             if not self.no_load_on_init:
                 self.reset(reset_sort=True)
 
-        return super().render(size, focus)
+        if self.stats is None:
+            return super().render(size, focus)
+
+        with self.stats.timer("render"):
+            canvas = super().render(size, focus)
+        self._emit("stats", self.stats)
+        return canvas
+
+    def reset_stats(self):
+        if self.stats is not None:
+            self.stats.reset()
 
     @property
     def width(self):
@@ -654,6 +748,9 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
         key = super().keypress(size, key)
         if key == "enter" and self.selection and not self.selection.details_focused:
             self._emit("select", self.selection.data)
+        elif key and key == self.search_key and self.search_bar is None:
+            self.search_on()
+            return
         # else:
         #     # key = super().keypress(size, key)
         return key
@@ -700,9 +797,19 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
             raise
             logger.error(traceback.format_exc())
     def index_to_position(self, index):
-        # raise Exception(index, self.df.index)
-        # return self.df.index.index(index)
-        return self.filtered_rows.index(index)
+        # cached like DataTableDataFrame.index_position, and checked against
+        # filtered_rows so filtering and sorting invalidate it implicitly
+        try:
+            position = self._filtered_positions[index]
+            if self.filtered_rows[position] == index:
+                return position
+        except (KeyError, IndexError, TypeError):
+            pass
+        self._filtered_positions = { x: i for i, x in enumerate(self.filtered_rows) }
+        try:
+            return self._filtered_positions[index]
+        except (KeyError, TypeError):
+            raise ValueError("%s is not in list" %(index,))
 
     def get_dataframe_row(self, index):
         try:
@@ -727,13 +834,15 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
             elif hasattr(cls, "__dataclass_fields__"):
                 # Python dataclasses
                 # klass = type(f"DataTableRow_{cls.__name__}", [cls],
-                klass = make_dataclass(
-                    f"DataTableRow_{cls.__name__}",
-                    [
-                        ("_cls", typing.Optional[typing.Any], field(default=None)),
-                    ],
-                    bases=(cls,)
-                )
+                klass = self._row_object_classes.get(cls)
+                if not klass:
+                    klass = self._row_object_classes[cls] = make_dataclass(
+                        f"DataTableRow_{cls.__name__}",
+                        [
+                            ("_cls", typing.Optional[typing.Any], field(default=None)),
+                        ],
+                        bases=(cls,)
+                    )
                 k = klass(
                     **{k: d[k]
                        for k in set(
@@ -758,14 +867,15 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
         row = self.df.get(index, "_rendered_row")
         details_open = False
         if self.df.get(index, "_dirty") or row is None:
+            if self.stats is not None:
+                self.stats.count("rows_built" if row is None else "rows_rebuilt")
             self.refresh_calculated_fields([index])
             # vals = self[index]
 
-            pos = self.index_to_position(index)
-            vals = self.get_dataframe_row_object(index)
-            row = self.render_item(index)
-            position = self.index_to_position(index)
+            with timed(self.stats, "render_item"):
+                row = self.render_item(index)
             if self.row_attr_fn:
+                position = self.index_to_position(index)
                 attr = self.row_attr_fn(position, row.data_source, row)
                 if attr:
                     row.set_attr(attr)
@@ -776,19 +886,74 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
                 row.open_details()
             self.df.set(index, "_rendered_row", row)
             self.df.set(index, "_dirty", False)
+        elif row.layout_version != self._layout_version:
+            if self.stats is not None:
+                self.stats.count("rows_relaid_out")
+            row.update_layout()
+        elif row.width_version != self._width_version:
+            if self.stats is not None:
+                self.stats.count("rows_resized")
+            row.update_widths()
+        elif self.stats is not None:
+            self.stats.count("row_cache_hits")
 
         return row
 
     def get_row_by_position(self, position):
         # index = self.position_to_index(self.filtered_rows[position])
         index = self.filtered_rows[position]
+        if isinstance(index, DataTableGroup):
+            return self.get_group_row(index)
         return self.get_row(index)
 
+    def get_group_row(self, group):
+        row = group.row
+        if row is None:
+            row = group.row = DataTableGroupRow(
+                self, group,
+                row_height = self.row_height,
+                divider = self.divider,
+                padding = self.padding,
+                style = self.row_style
+            )
+        elif row.layout_version != self._layout_version:
+            row.update_layout()
+        elif row.width_version != self._width_version:
+            row.update_widths()
+        return row
+
+    def rows_at(self, position, size, focus=False):
+        # height of the row at position, without building it if it hasn't
+        # been yet: new rows are row_height tall, with their details closed
+        index = self.filtered_rows[position]
+        if isinstance(index, DataTableGroup):
+            row = index.row
+        elif self.df.get(index, "_dirty"):
+            row = None
+        else:
+            row = self.df.get(index, "_rendered_row")
+        if row is None:
+            return self.row_height or 1
+        return row.rows(size, focus)
+
+    def row_index(self, position):
+        # grouped views interleave header rows with the data rows, so
+        # positions are looked up in the view rather than the dataframe
+        if not self.group_by:
+            return self.position_to_index(position)
+        index = self.filtered_rows[position]
+        if isinstance(index, DataTableGroup):
+            raise Exception("row %d is a group header, not a data row" %(position))
+        return index
+
     def get_value(self, row, column):
-        return self.df[self.position_to_index(row), column]
+        return self.df.get_cell(self.row_index(row), column)
 
     def set_value(self, row, column, value):
-        self.df.set(self.position_to_index(row), column, value)
+        index = self.row_index(row)
+        self.df.set(index, column, value)
+        self.update_search_indexes([index], column)
+        self.update_groups([index], column)
 
     @property
     def selection(self):
@@ -801,7 +966,7 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
 
     @property
     def selection_data(self):
-        return AttrDict(self.df.get_columns(self.position_to_index(self.focus_position), as_dict=True))
+        return AttrDict(self.df.get_columns(self.row_index(self.focus_position), as_dict=True))
 
     def render_item(self, index):
         row = DataTableBodyRow(self, index,
@@ -813,7 +978,88 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
                                style = self.row_style)
         return row
 
+    def get_detail_content(self, row):
+
+        index = row.index
+        if index in self._detail_cache:
+            self._detail_cache.move_to_end(index)
+            return self._detail_cache[index]
+
+        if not (self.detail_async or asyncio.iscoroutinefunction(self.detail_fn)):
+            content = self.detail_fn(row.data_source)
+            self.cache_detail_content(index, content)
+            return content
+
+        if index not in self._detail_tasks:
+            self._detail_tasks[index] = asyncio.get_event_loop().create_task(
+                self._load_detail_content_async(index, row.data_source)
+            )
+        return urwid.Text(self.detail_placeholder)
+
+    async def _load_detail_content_async(self, index, data_source):
+
+        failed = False
+        try:
+            if asyncio.iscoroutinefunction(self.detail_fn):
+                content = await self.detail_fn(data_source)
+            else:
+                content = await asyncio.get_event_loop().run_in_executor(
+                    None, self.detail_fn, data_source
+                )
+        except Exception:
+            logger.exception("error loading details for %s" %(index,))
+            failed = True
+            content = urwid.Text(self.detail_error)
+        finally:
+            self._detail_tasks.pop(index, None)
+        if not failed:
+            self.cache_detail_content(index, content)
+
+        try:
+            row = self.df.get(index, "_rendered_row")
+        except ValueError:
+            # row was removed while the details were loading
+            return
+        if row is not None:
+            row.update_details(content, keep=not failed)
+            self._modified()
+
+    def cache_detail_content(self, index, content):
+        if not self.detail_cache_size:
+            return
+        self._detail_cache[index] = content
+        self._detail_cache.move_to_end(index)
+        while len(self._detail_cache) > self.detail_cache_size:
+            self._detail_cache.popitem(last=False)
+
+    def invalidate_details(self, indexes=None):
+        if indexes is None:
+            self._detail_cache.clear()
+            return
+        for index in indexes:
+            self._detail_cache.pop(index, None)
+
+    def schedule_open_details(self):
+        # wait until the cursor has settled before opening the focused row's
+        # details, so scrolling quickly doesn't load details for every row
+        # that passes by
+        if self._detail_open_handle:
+            self._detail_open_handle.cancel()
+        self._detail_open_handle = asyncio.get_event_loop().call_later(
+            self.detail_delay, self._open_focused_details
+        )
+
+    def _open_focused_details(self):
+        self._detail_open_handle = None
+        if self.selection:
+            self.selection.open_details()
+            self._modified()
+
     def refresh_calculated_fields(self, indexes=None):
+        with timed(self.stats, "refresh_calculated_fields"):
+            self._refresh_calculated_fields(indexes)
+
+    def _refresh_calculated_fields(self, indexes=None):
         if not indexes:
             indexes = self.df.index[:]
         if not hasattr(indexes, "__len__"):
@@ -823,6 +1069,9 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
             for index in indexes:
                 if self.df[index, "_dirty"]:
                     self.df.set(index, col.name, col.value_fn(self, self.get_dataframe_row_object(index)))
+                    if col.name in self._search_indexes:
+                        self.update_search_indexes([index], col.name)
+                    self.invalidate_groups([index])
 
     def visible_data_column_index(self, column_name):
         try:
@@ -907,10 +1156,15 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
         logger.debug(column)
         if not key:
             key = lambda x: (x is None, x)
-        self.df.sort_columns(
-            column,
-            key = key,
-            reverse = self.sort_by[1])
+        with timed(self.stats, "sort"):
+            self.df.sort_columns(
+                column,
+                key = key,
+                reverse = self.sort_by[1])
+            positions = { idx: i for i, idx in enumerate(self.df.index) }
+            self._ungrouped_rows.sort(key=positions.__getitem__)
+            if self.group_by:
+                self.group_rows(self._ungrouped_rows)
         self._modified()
 
 
@@ -946,6 +1200,165 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
         self.df.sort_index()
         self._modified()
 
+    @property
+    def search_column(self):
+        # the column with cell focus, else the sort column, else the first
+        # visible data column
+        if self.cell_selection and self.selection:
+            try:
+                column = self.visible_columns[self.selection.columns.focus_position]
+                if not isinstance(column, DataTableDivider):
+                    return column.name
+            except IndexError:
+                pass
+        if self.sort_by[0]:
+            return self.sort_by[0]
+        return self.visible_data_columns[0].name
+
+    def search_index(self, column):
+        # built on first use, then kept up to date as rows are added, changed
+        # and deleted
+        search_index = self._search_indexes.get(column)
+        if search_index is None:
+            search_index = DataTableSearchIndex(self, column)
+            self._search_indexes[column] = search_index
+        return search_index
+
+    def update_search_indexes(self, indexes, column=None):
+        for name, search_index in self._search_indexes.items():
+            if column is not None and name != column:
+                continue
+            search_index.update_rows(indexes)
+
+    def search(self, text, column=None, anywhere=None, step=0):
+
+        if not text or not len(self):
+            return None
+        if anywhere is None:
+            anywhere = self.search_anywhere
+
+        matches = self.search_index(column or self.search_column).find(text, anywhere)
+        if not matches:
+            return None
+        focus = self.focus_position
+        if len(matches) * len(matches) > len(self.filtered_rows):
+            # many matches: the nearest one is only a few rows away, so walk
+            # the rows from the focus rather than looking up every match
+            matches = set(matches)
+            found = next(
+                ((position, index)
+                 for position, index in self.iter_search_rows(focus, step)
+                 if index in matches),
+                None
+            )
+        else:
+            found = self.search_nearest(matches, focus, step)
+        if found is None:
+            return None
+        (pos, index) = found
+        if isinstance(self.filtered_rows[pos], DataTableGroup):
+            self.expand_group(self.filtered_rows[pos])
+            pos = self.index_to_position(index)
+        self.focus_position = pos
+        return pos
+
+    def iter_search_rows(self, focus, step=0):
+        # (position, index) of each data row in the order search() tries
+        # them: from the focused row on (after or before it, if stepping
+        # forward or backward), wrapping around the ends of the table.  Rows
+        # in collapsed groups come right after their group's header, with
+        # the header's position.
+        rows = self.filtered_rows
+        if step < 0:
+            positions = itertools.chain(
+                range(focus-1, -1, -1), range(len(rows)-1, focus-1, -1)
+            )
+        else:
+            if step > 0 and not isinstance(rows[focus], DataTableGroup):
+                focus += 1
+            positions = itertools.chain(range(focus, len(rows)), range(focus))
+        for position in positions:
+            row = rows[position]
+            if not isinstance(row, DataTableGroup):
+                yield (position, row)
+            elif not row.expanded:
+                for index in (reversed(row.members) if step < 0 else row.members):
+                    yield (position, index)
+
+    def search_nearest(self, matches, focus, step=0):
+        # same result as the first match from iter_search_rows, for a few
+        # matches: rows in collapsed groups get a fractional position
+        # between their group's header and the next row
+        positions = {}
+        members = {}
+        for index in matches:
+            try:
+                positions[self.index_to_position(index)] = index
+                continue
+            except ValueError:
+                pass
+            group = self.group_for(index) if self.group_by else None
+            if group is None or group.expanded:
+                # filtered out
+                continue
+            if group not in members:
+                members[group] = { i: n+1 for n, i in enumerate(group.members) }
+            position = self.index_to_position(group)
+            positions[position + members[group][index] / (len(group) + 1)] = index
+        if not positions:
+            return None
+        if step < 0:
+            pos = max((p for p in positions if p < focus), default=max(positions))
+        elif step > 0:
+            pos = min((p for p in positions if p > focus), default=min(positions))
+        else:
+            pos = min((p for p in positions if p >= focus), default=min(positions))
+        return (int(pos), positions[pos])
+
+    def search_on(self, anywhere=False):
+
+        if self.search_bar is not None:
+            return
+        self.search_anywhere = anywhere
+        self.search_bar = AutoCompleteBar(prompt_attr=self.search_prompt_attr)
+        urwid.connect_signal(
+            self.search_bar, "change",
+            lambda source, text: self.search(text)
+        )
+        urwid.connect_signal(
+            self.search_bar, "complete_next",
+            lambda source: self.search(self.search_bar.text.get_edit_text(), step=1)
+        )
+        urwid.connect_signal(
+            self.search_bar, "complete_prev",
+            lambda source: self.search(self.search_bar.text.get_edit_text(), step=-1)
+        )
+        urwid.connect_signal(self.search_bar, "select", lambda source: self.search_off())
+        urwid.connect_signal(self.search_bar, "close", lambda source: self.search_off())
+
+        pos = next(
+            i for i, (w, o) in enumerate(self.pile.contents)
+            if w is self.listbox_placeholder
+        ) + 1
+        self.pile.contents.insert(
+            pos, (self.search_bar, self.pile.options("given", 1))
+        )
+        self.pile.focus_position = pos
+
+    def search_off(self):
+
+        if self.search_bar is None:
+            return
+        for i, (w, o) in enumerate(self.pile.contents):
+            if w is self.search_bar:
+                del self.pile.contents[i]
+                break
+        self.search_bar = None
+        self.pile.focus_position = next(
+            i for i, (w, o) in enumerate(self.pile.contents)
+            if w is self.listbox_placeholder
+        )
+
     def add_columns(self, columns, data=None):
 
         if not isinstance(columns, list):
@@ -959,7 +1372,7 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
             column.table = self
             self.df[column.name] = data=data[i] if data else None
 
-        self.invalidate()
+        self.invalidate_layout()
 
     def remove_columns(self, columns):
 
@@ -973,7 +1386,7 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
 
         self._columns = [ c for c in self._columns if c.name not in columns ]
         self.df.delete_columns(columns)
-        self.invalidate()
+        self.invalidate_layout()
 
     def set_columns(self, columns):
         # logger.info(self._columns)
@@ -996,20 +1409,20 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
             else:
                 try:
                     column = next(( c for c in self._columns if c.name == column))
-                except IndexError:
+                except StopIteration:
                     raise Exception("column %s not found" %(column))
 
             if show is None:
                 column.hide = not column.hide
             else:
-                column.hide = show
-        self.invalidate()
+                column.hide = not show
+        self.invalidate_layout()
 
     def show_columns(self, columns):
         self.toggle_columns(columns, True)
 
     def hide_columns(self, columns):
-        self.show_column(columns, False)
+        self.toggle_columns(columns, False)
 
     def resize_column(self, name, size):
 
@@ -1026,11 +1439,9 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
             raise NotImplementedError
         if self.with_header:
             self.header.update()
-        for r in self:
-            r.update()
         if self.with_footer:
             self.footer.update()
-        #     r.resize_column(index, size)
+        self.invalidate_widths()
 
     def on_header_drag(self, source, source_column, start, end):
 
@@ -1143,25 +1554,20 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
             logger.warning(f"{sum(widths)} != {sum(new_widths)}")
 
     def resize_body_rows(self):
-        for r in self:
-            r.on_resize()
+        self.invalidate_widths()
 
     # def toggle_details(self):
     #     self.selection.toggle_details()
 
     def enable_cell_selection(self):
         logger.debug("enable_cell_selection")
-        for r in self:
-            r.enable_cell_selection()
-        self.reset()
         self.cell_selection = True
+        self.invalidate()
 
     def disable_cell_selection(self):
         logger.debug("disable_cell_selection")
-        for r in self:
-            r.disable_cell_selection()
-        self.reset()
         self.cell_selection = False
+        self.invalidate()
 
     def toggle_cell_selection(self):
         if self.cell_selection:
@@ -1187,14 +1593,24 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
 
     def add_row(self, data, sort=True):
 
+        n = len(self.df)
         self.df.append_rows([data])
+        self.update_search_indexes(self.df.index[n:])
+        self.invalidate_row_count()
         if sort:
             self.sort_by_column()
         self.apply_filters()
 
     def delete_rows(self, indexes):
 
+        if not isinstance(indexes, list):
+            indexes = [indexes]
         self.df.delete_rows(indexes)
+        self.invalidate_details(indexes)
+        for search_index in self._search_indexes.values():
+            for index in indexes:
+                search_index.remove(index)
+        self.invalidate_row_count()
         self.apply_filters()
         if self.focus_position > 0 and self.focus_position >= len(self)-1:
             self.focus_position = len(self)-1
@@ -1206,9 +1622,36 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
             self.header.update()
         if self.with_footer:
             self.footer.update()
-        self.invalidate()
+        self._modified()
 
-        # self._modified()
+    def shared_attr_maps(self, key, make):
+        # attribute maps shared by all rows/cells with the same key
+        try:
+            return self._attr_maps[key]
+        except KeyError:
+            maps = self._attr_maps[key] = make()
+            return maps
+
+    def invalidate_widths(self):
+        # Column widths live on the column objects, so a resize only needs
+        # rows to refresh their Columns options and heights.  As with layout
+        # changes, that happens lazily in get_row, so only rows that are
+        # actually displayed pay for it.
+        self._width_version += 1
+        self._modified()
+
+    def invalidate_layout(self):
+        # Column layout changed.  Rather than touching every row, bump the
+        # layout version: rows that have already been built notice the
+        # mismatch and rebuild their cells in get_row the next time they're
+        # fetched, and rows that haven't been built yet are unaffected.
+        self._layout_version += 1
+        self._width_version += 1
+        if self.with_header:
+            self.header.update()
+        if self.with_footer:
+            self.footer.update()
+        self._modified()
 
     def invalidate_rows(self, indexes):
         if not isinstance(indexes, list):
@@ -1216,6 +1659,7 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
         for index in indexes:
             self.refresh_calculated_fields(index)
 
+        self.invalidate_details(indexes)
         self.df[indexes, "_dirty"] = True
         self._modified()
         # FIXME: update header / footer if dynamic
@@ -1253,26 +1697,108 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
         # if not self.limit:
         #     return None
 
-        if self.limit:
-            return self.query_result_count()
-        else:
+        if not self.limit:
+            return len(self)
+
+        if self.snapshot is not None:
+            return len(self.snapshot)
+
+        if (self._row_count is None
+            or (self.row_count_ttl is not None
+                and time.monotonic() - self._row_count_time > self.row_count_ttl)
+        ):
+            self.update_row_count()
+
+        if self._row_count is None:
+            # count query still pending
             return len(self)
+        return self._row_count
+
+    def update_row_count(self):
+
+        if self._row_count_task is not None:
+            return
+
+        if asyncio.iscoroutinefunction(self.query_result_count):
+            # called from the task, so a count cancelled before it starts
+            # isn't left un-awaited
+            self.row_count_estimated = True
+            self._row_count_task = asyncio.get_event_loop().create_task(
+                self._update_row_count_async()
+            )
+        else:
+            self.set_row_count(self._query_result_count())
+
+    def _query_result_count(self):
+        if self.query_filter:
+            return self.query_result_count(filters=self.filters)
+        return self.query_result_count()
+
+    async def _update_row_count_async(self):
+
+        try:
+            count = await self._query_result_count()
+        except asyncio.CancelledError:
+            return
+        except Exception:
+            # keep the last count, or the rows loaded so far, rather than
+            # retrying on every redraw
+            logger.exception("query_result_count failed")
+            count = self._row_count if self._row_count is not None else len(self)
+        finally:
+            # a cancelled task may finish after its replacement has started
+            if self._row_count_task is asyncio.current_task():
+                self._row_count_task = None
+        self.set_row_count(count)
+        self._modified()
+
+    def set_row_count(self, count):
+        self._row_count = count
+        self._row_count_time = time.monotonic()
+        self.row_count_estimated = False
+
+    def invalidate_row_count(self):
+
+        if self._row_count_task is not None:
+            self._row_count_task.cancel()
+            self._row_count_task = None
+        self._row_count = None
+        self.row_count_estimated = False
 
     def apply_filters(self, filters=None):
 
         if not filters:
             filters = self.filters
-        elif not isinstance(filters, list):
-            filters = [filters]
-
-        self.filtered_rows = list(
-            row[self.df.index_name]
-            for i, row in enumerate(self.df.iterrows())
-            if not filters or all(
-                    f(row)
-                    for f in filters
-            )
-        )
+        else:
+            if not isinstance(filters, list):
+                filters = [filters]
+            filters = [DataTableFilter.make(f) for f in filters]
+
+        if self.query_filter:
+            # filtering is done by the data source, so a new set of filters
+            # means a new query, and all loaded rows are already filtered
+            if filters != self.filters:
+                self.filters = filters
+                self.reset()
+                return
+            self._set_filtered_rows(list(self.df.index))
+            return
+
+        with timed(self.stats, "apply_filters"):
+            if not filters:
+                rows = list(self.df.index)
+            else:
+                rows = list(
+                    row[self.df.index_name]
+                    for i, row in enumerate(self.df.iterrows())
+                    if all(
+                            f(row)
+                            for f in filters
+                    )
+                )
+            self._set_filtered_rows(rows)
+        if self.stats is not None and filters:
+            self.stats.count("filter_evaluations", len(self.df) * len(filters))
         # if self.focus_position > len(self):
         #     self.focus_position = len(self)-1
 
@@ -1282,18 +1808,141 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
         self.filters = filters
         # self.invalidate()
 
+    def apply_filters_from(self, start):
+
+        # like apply_filters(), for rows appended to the dataframe from
+        # position start on: the rows already filtered are left alone
+        filters = self.filters
+        with timed(self.stats, "apply_filters"):
+            if self.query_filter or not filters:
+                rows = self.df.index[start:]
+            else:
+                rows = [
+                    row[self.df.index_name]
+                    for row in (
+                            self.df.get_location(i, as_dict=True)
+                            for i in range(start, len(self.df))
+                    )
+                    if all(f(row) for f in filters)
+                ]
+            self._set_filtered_rows(self._ungrouped_rows + list(rows))
+        if self.stats is not None and filters and not self.query_filter:
+            self.stats.count("filter_evaluations", (len(self.df) - start) * len(filters))
+
     def clear_filters(self):
-        self.filtered_rows = list(range(len(self.df)))
+        if self.query_filter and self.filters:
+            self.filters = None
+            self.reset()
+            return
+        self._set_filtered_rows(list(self.df.index))
         self.filters = None
         # self.invalidate()
 
 
+    def _set_filtered_rows(self, rows):
+        self._ungrouped_rows = rows
+        if self.group_by:
+            self.group_rows(rows)
+        else:
+            self.filtered_rows = rows
+
+    def group_rows(self, rows):
+
+        with timed(self.stats, "group_rows"):
+            positions = { idx: i for i, idx in enumerate(self.df.index) }
+            columns = [ self.df.data[self.df.column_position(c)] for c in self.group_by ]
+            members = OrderedDict()
+            keys = {}
+            for index in rows:
+                i = positions[index]
+                key = keys[index] = tuple(values[i] for values in columns)
+                members.setdefault(key, []).append(index)
+
+            # reuse existing groups so expanded state, header rows and
+            # aggregates survive for groups whose membership didn't change
+            groups = OrderedDict()
+            for key, indexes in members.items():
+                group = self.groups.get(key) or DataTableGroup(key)
+                group.set_members(indexes)
+                groups[key] = group
+            self.groups = groups
+            self._group_keys = keys
+        self._update_group_view()
+
+    def _update_group_view(self):
+        rows = []
+        for group in self.groups.values():
+            rows.append(group)
+            if group.expanded:
+                rows.extend(group.members)
+        self.filtered_rows = rows
+        self._modified()
+
+    def set_group_by(self, columns, aggregates=None):
+        if isinstance(columns, str):
+            columns = [columns]
+        self.group_by = columns or None
+        if aggregates is not None:
+            self.group_aggregates = aggregates
+        self.groups = OrderedDict()
+        self._group_keys = {}
+        self._set_filtered_rows(self._ungrouped_rows)
+        if len(self):
+            self.focus_position = 0
+        self._modified()
+
+    def clear_group_by(self):
+        self.set_group_by(None)
+
+    def group_for(self, index):
+        return self.groups.get(self._group_keys.get(index))
+
+    def toggle_group(self, group=None, expanded=None):
+        if not self.group_by:
+            return
+        if group is None:
+            group = self.filtered_rows[self.focus_position]
+            if not isinstance(group, DataTableGroup):
+                group = self.group_for(group)
+        if expanded is None:
+            expanded = not group.expanded
+        if expanded == group.expanded:
+            return
+        group.expanded = expanded
+        # rebuild the header so the expand/collapse icon is updated
+        group.row = None
+        self._update_group_view()
+        self.focus_position = self.index_to_position(group)
+
+    def expand_group(self, group=None):
+        self.toggle_group(group, True)
+
+    def collapse_group(self, group=None):
+        self.toggle_group(group, False)
+
+    def update_groups(self, indexes, column=None):
+        if not self.group_by:
+            return
+        if column is None or column in self.group_by:
+            # membership may have changed
+            self.group_rows(self._ungrouped_rows)
+        else:
+            self.invalidate_groups(indexes)
+
+    def invalidate_groups(self, indexes=None):
+        if indexes is None:
+            groups = self.groups.values()
+        else:
+            groups = set(filter(None, (self.group_for(i) for i in indexes)))
+        for group in groups:
+            group.invalidate()
+
     def load_all(self):
-        if len(self) >= self.query_result_count():
+        if len(self.df) >= self.row_count():
             return
         logger.debug("load_all: %s" %(self.page))
         self.requery(self.page*self.limit, load_all=True)
-        self.page = (self.query_result_count() // self.limit)
+        self.page = (self.row_count() // self.limit)
         self.listbox._invalidate()
 
 
@@ -1335,6 +1984,8 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
             kwargs["sort"] = self.sort_by
         else:
             kwargs["sort"] = (None, False)
+        if self.query_filter:
+            kwargs["filters"] = self.filters
         limit = limit or self.limit
         if limit:
             kwargs["offset"] = offset
@@ -1342,13 +1993,35 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
 
         if offset:
             kwargs["cursor"] = self.pagination_cursor
-
-        rows = list(self.query(**kwargs)) if self.data is None else self.data
+            if self.query_accepts("cursor_index"):
+                kwargs["cursor_index"] = self.pagination_cursor_index
+
+        with timed(self.stats, "query"):
+            if self.snapshot is not None:
+                # without a limit the whole snapshot is loaded, like data
+                rows = self.snapshot.query(**dict(
+                    kwargs, load_all=load_all or self.limit is None
+                ))
+                if self.with_sidecar:
+                    rows = [ (r, {}) for r in rows ]
+            elif self.data is None:
+                rows = list(self.query(**kwargs))
+            else:
+                rows = self.data
 
         if len(rows) and self.sort_by[0]:
-            self.pagination_cursor = getattr(rows[-1], self.sort_by[0])
+            last = rows[-1][0] if self.with_sidecar else rows[-1]
+            self.pagination_cursor = self.df.extract_value(last, self.sort_by[0])
+            self.pagination_cursor_index = self.df.extract_value(last, self.index)
+
+        return self.load_rows(rows, replace=self.limit is None)
+
+    def load_rows(self, rows, replace=False):
 
-        updated = self.df.update_rows(rows, replace=self.limit is None, with_sidecar = self.with_sidecar)
+        # add or update the dataframe rows from a query and refresh
+        # everything that depends on them
+        with timed(self.stats, "update_rows"):
+            updated = self.df.update_rows(rows, replace=replace, with_sidecar = self.with_sidecar)
 
         self.df["_focus_position"] = self.sort_column
 
@@ -1358,16 +2031,20 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
             self.sort_by_column(self.initial_sort)
 
 
-        if len(updated):
-            for i in updated:
-                if not i in self.filtered_rows:
-                    continue
-                pos = self.index_to_position(i)
-                self[pos].update()
-            # self.sort_by_column(*self.sort_by)
+        self.update_search_indexes(updated)
+        self.invalidate_groups(updated)
+        for i in updated:
+            # rows that have already been built pick up the new values the
+            # next time they're fetched; rows that haven't been built yet
+            # don't need to be
+            row = self.df.get(i, "_rendered_row")
+            if row is not None:
+                row.layout_version = None
 
         self._modified()
         self._emit("requery", self.row_count())
+        if self.stats is not None:
+            self._emit("stats", self.stats)
 
         if not len(self) and self.empty_message:
             self.show_message(self.empty_message)
@@ -1379,10 +2056,14 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
 
     def refresh(self, reset=False):
         logger.debug(f"refresh: {reset}")
+        self.invalidate_row_count()
+        self.invalidate_details()
+        self._search_indexes.clear()
         offset = None
         idx = None
         pos = 0
-        # limit = len(self)-1
+        # as many data rows as are loaded now, whatever the view shows
+        loaded = len(self.df)
         self.df.delete_all_rows()
         if reset:
             self.page = 0
@@ -1394,7 +2075,7 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
                 pos = self.focus_position
             except (AttributeError, IndexError, ValueError):
                 pos = None
-            limit = len(self)
+            limit = loaded
         # del self[:]
         self.requery(offset=offset, limit=limit)
 
@@ -1425,6 +2106,7 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
     def reset(self, reset_sort=False):
 
         self.pagination_cursor = None
+        self.pagination_cursor_index = None
         self.refresh(reset=True)
 
         if reset_sort and self.initial_sort is not None:
@@ -1498,14 +2180,139 @@ class DataTable(urwid.WidgetWrap, urwid.listbox.ListWalker):
 
     def load(self, path):
 
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+
+        if os.path.isdir(path):
+            # columnar snapshot: rows are read from the memory-mapped column
+            # files as they're queried, a page at a time if limit is set
+            if self.query_sort or self.query_filter:
+                raise Exception(
+                    "columnar snapshots can't be sorted or filtered by query"
+                )
+            self.snapshot = DataTableSnapshot(path)
+            self.reset()
+            return
+
+        # the rows are loaded as if they were queried, without replacing
+        # the table's data or query method
         with open(path, "r") as f:
-            json = "\n".join(f.readlines())
-            self.df = DataTableDataFrame.from_json(json)
-        self.reset()
+            d = json.load(f)
+        index_name = d["meta_data"]["index_name"]
+        columns = [
+            c for c in d["data"].keys()
+            if c not in DataTableDataFrame.DATA_TABLE_COLUMNS
+        ]
+        rows = [
+            dict(zip([index_name] + columns, values))
+            for values in zip(d["index"], *[d["data"][c] for c in columns])
+        ]
+        if self.with_sidecar:
+            rows = [ (r, {}) for r in rows ]
+        self.invalidate_row_count()
+        self.invalidate_details()
+        self._search_indexes.clear()
+        self.df.delete_all_rows()
+        self.page = 0
+        self.load_rows(rows, replace=True)
 
-    def save(self, path):
+    def save(self, path, format="json"):
         # print(path)
-        with open(path, "w") as f:
-            f.write(self.df.to_json())
+        if format == "columnar":
+            DataTableSnapshot.write(path, self.df)
+        elif format == "json":
+            with open(path, "w") as f:
+                f.write(self.df.to_json())
+        else:
+            raise Exception("unsupported format: %s" %(format))
+
+    def iter_rows(self, view=True):
+
+        columns = [
+            c for c in self.df.columns
+            if c not in DataTableDataFrame.DATA_TABLE_COLUMNS
+            and c != self.df.index_name
+        ]
+        data = [ self.df.data[self.df.columns.index(c)] for c in columns ]
+        if view:
+            positions = { idx: i for i, idx in enumerate(self.df.index) }
+            indexes = ( positions[idx] for idx in self._ungrouped_rows )
+        else:
+            indexes = range(len(self.df))
+
+        for i in indexes:
+            row = { self.df.index_name: self.df.index[i] }
+            for c, values in zip(columns, data):
+                row[c] = values[i]
+            yield row
+
+    def export(self, path, format=None, view=True):
+
+        write, _ = stream_format(path, format)
+        columns = [self.df.index_name] + [
+            c for c in self.df.columns
+            if c not in DataTableDataFrame.DATA_TABLE_COLUMNS
+            and c != self.df.index_name
+        ]
+        with open(path, "w", newline="") as f:
+            write(f, self.iter_rows(view=view), columns)
+
+    def import_rows(self, path, format=None, batch_size=1000):
+
+        # generator: each step appends one batch of rows and yields the number
+        # of rows loaded so far, so callers can drive it from an idle handler
+        # or alarm and keep the UI responsive while a large file loads.
+        _, read = stream_format(path, format)
+        index_name = self.df.index_name
+        # values read as text are converted with the column types; an index
+        # without one is an integer if it looks like one
+        types = {
+            c.name: c.type for c in self.data_columns
+            if getattr(c, "type", None)
+        }
+        def index_type(value):
+            try:
+                return int(value)
+            except ValueError:
+                return value
+        types.setdefault(index_name, index_type)
+
+        # rows without an index are numbered after the largest one in use
+        index = max(
+            (i for i in self.df.index if isinstance(i, int)), default=-1
+        ) + 1
+        with open(path, "r", newline="") as f:
+            rows = read(f)
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                for row in batch:
+                    for name, fn in types.items():
+                        value = row.get(name)
+                        if isinstance(value, str):
+                            row[name] = fn(value)
+                index = max(
+                    [index] + [
+                        row[index_name] + 1 for row in batch
+                        if isinstance(row.get(index_name), int)
+                    ]
+                )
+                for row in batch:
+                    if row.get(index_name) in (None, ""):
+                        row[index_name] = index
+                        index += 1
+                n = len(self.df)
+                self.df.append_rows(batch)
+                self.update_search_indexes(self.df.index[n:])
+                self.invalidate_row_count()
+                self.apply_filters_from(n)
+                self.hide_message()
+                self._modified()
+                yield len(self.df)
+
+        if self.sort_by[0]:
+            self.sort_by_column(self.sort_by)
 
 __all__ = ["DataTable", "DataTableColumn"]
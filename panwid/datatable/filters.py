@@ -0,0 +1,57 @@
+import operator
+
+def _contains(a, b):
+    return a is not None and b in a
+
+def _startswith(a, b):
+    return a is not None and str(a).startswith(b)
+
+class DataTableFilter(object):
+
+    OPERATORS = {
+        "==": operator.eq,
+        "!=": operator.ne,
+        "<": operator.lt,
+        "<=": operator.le,
+        ">": operator.gt,
+        ">=": operator.ge,
+        "in": lambda a, b: a in b,
+        "contains": _contains,
+        "startswith": _startswith,
+    }
+
+    def __init__(self, column, op, value):
+        if op not in self.OPERATORS:
+            raise Exception("unsupported filter operator: %s" %(op))
+        self.column = column
+        self.op = op
+        self.value = value
+
+    @classmethod
+    def make(cls, f):
+        if isinstance(f, tuple):
+            return cls(*f)
+        return f
+
+    def __call__(self, row):
+        v = row.get(self.column)
+        try:
+            return self.OPERATORS[self.op](v, self.value)
+        except TypeError:
+            # comparisons against None and mixed types never match
+            return False
+
+    def as_tuple(self):
+        return (self.column, self.op, self.value)
+
+    def __eq__(self, other):
+        return (isinstance(other, DataTableFilter)
+                and self.as_tuple() == other.as_tuple())
+
+    def __hash__(self):
+        return hash((self.column, self.op, repr(self.value)))
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}: {self.column} {self.op} {self.value!r}>"
+
+__all__ = ["DataTableFilter"]
@@ -0,0 +1,56 @@
+import logging
+logger = logging.getLogger("panwid.datatable")
+
+def _values(values):
+    return [ v for v in values if v is not None ]
+
+def _mean(values):
+    values = _values(values)
+    return sum(values) / len(values) if values else None
+
+AGGREGATES = {
+    "count": len,
+    "sum": lambda values: sum(_values(values)),
+    "min": lambda values: min(_values(values), default=None),
+    "max": lambda values: max(_values(values), default=None),
+    "mean": _mean,
+}
+
+
+class DataTableGroup(object):
+
+    def __init__(self, key, expanded=False):
+        self.key = key
+        self.members = []
+        self.expanded = expanded
+        self.row = None
+        self._aggregates = {}
+
+    def __len__(self):
+        return len(self.members)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}: {self.key} ({len(self)})>"
+
+    def set_members(self, members):
+        if members != self.members:
+            self.members = members
+            self.invalidate()
+
+    def invalidate(self):
+        self._aggregates.clear()
+        self.row = None
+
+    def aggregate(self, df, column, fn):
+        try:
+            return self._aggregates[column]
+        except KeyError:
+            pass
+        if isinstance(fn, str):
+            fn = AGGREGATES[fn]
+        value = self._aggregates[column] = fn(
+            [ df.get_cell(i, column) for i in self.members ]
+        )
+        return value
+
+__all__ = ["DataTableGroup"]
@@ -5,10 +5,19 @@ import urwid
 
 from .cells import *
 from .columns import *
+from .dataframe import *
 from orderedattrdict import AttrDict
 
 class DataTableRow(urwid.WidgetWrap):
 
+    # defaults live on the class so rows only carry the attributes that
+    # differ from them
+    row_height = None
+    divider = None
+    padding = None
+    cell_selection = False
+    style = None
+
     def __init__(self, table,
                  content=None,
                  row_height=None,
@@ -18,48 +27,24 @@ class DataTableRow(urwid.WidgetWrap):
                  *args, **kwargs):
 
         self.table = table
-        self.row_height = row_height
+        if row_height is not None:
+            self.row_height = row_height
         self.content = content
         # if not isinstance(self.content, int):
         #     raise Exception(self.content, type(self))
-        self.divider = divider
-        self.padding = padding
-        self.cell_selection = cell_selection
-        self.style = style
-        # self.details = None
-        self.sort = self.table.sort_by
-        self.attr = self.ATTR
-        self.attr_focused = "%s focused" %(self.attr)
-        self.attr_column_focused = "%s column_focused" %(self.attr)
-        self.attr_highlight = "%s highlight" %(self.attr)
-        self.attr_highlight_focused = "%s focused" %(self.attr_highlight)
-        self.attr_highlight_column_focused = "%s column_focused" %(self.attr_highlight)
-        self.attr_map =  {
-            None: self.attr,
-        }
-
-        self.focus_map = {
-            self.attr: self.attr_focused,
-            self.attr_highlight: self.attr_highlight_focused,
-        }
-
-        # needed to restore if cell selection is toggled
-        self.original_focus_map = self.focus_map.copy()
-
-        # if self.cell_selection:
-        self.focus_map.update({
-            self.attr_focused: self.attr_column_focused,
-            self.attr_highlight_focused: self.attr_highlight_column_focused,
-        })
-        self.focus_map.update(self.table.column_focus_map)
-        self.cell_selection_focus_map = self.focus_map.copy()
-
+        if divider is not None:
+            self.divider = divider
+        if padding is not None:
+            self.padding = padding
         if cell_selection:
-            self.enable_cell_selection()
-        else:
-            self.disable_cell_selection()
+            self.cell_selection = cell_selection
+        if style is not None:
+            self.style = style
+        # self.details = None
 
-        self.focus_map.update(table.focus_map)
+        self._attr_maps = self.table.shared_attr_maps(
+            (self.__class__,), self.make_attr_maps
+        )
 
         self.contents_placeholder = urwid.WidgetPlaceholder(urwid.Text(""))
 
@@ -74,13 +59,85 @@ class DataTableRow(urwid.WidgetWrap):
             ("weight", 1, self.box)
         ])
 
-        self.attrmap = urwid.AttrMap(
-            self.pile,
-            attr_map = self.attr_map,
-            focus_map = self.focus_map,
+        super(DataTableRow, self).__init__(
+            urwid.AttrMap(
+                self.pile,
+                attr_map = self.attr_map,
+                focus_map = self.focus_map,
+            )
         )
 
-        super(DataTableRow, self).__init__(self.attrmap)
+    @property
+    def attrmap(self):
+        return self._wrapped_widget
+
+    @property
+    def sort(self):
+        return self.table.sort_by
+
+    @property
+    def attr_map(self):
+        return self._attr_maps[0]
+
+    @property
+    def original_focus_map(self):
+        # needed to restore if cell selection is toggled
+        return self._attr_maps[1]
+
+    @property
+    def cell_selection_focus_map(self):
+        return self._attr_maps[2]
+
+    @property
+    def focus_map(self):
+        if self.cell_selection:
+            return self.cell_selection_focus_map
+        return self.original_focus_map
+
+    @property
+    def attr(self):
+        return self.ATTR
+
+    @property
+    def attr_focused(self):
+        return "%s focused" %(self.attr)
+
+    @property
+    def attr_column_focused(self):
+        return "%s column_focused" %(self.attr)
+
+    @property
+    def attr_highlight(self):
+        return "%s highlight" %(self.attr)
+
+    @property
+    def attr_highlight_focused(self):
+        return "%s focused" %(self.attr_highlight)
+
+    @property
+    def attr_highlight_column_focused(self):
+        return "%s column_focused" %(self.attr_highlight)
+
+    def make_attr_maps(self):
+
+        # called once per row class; the maps are shared by every row of
+        # that class, so they must not be modified in place
+        attr_map = {None: self.attr}
+
+        focus_map = {
+            self.attr: self.attr_focused,
+            self.attr_highlight: self.attr_highlight_focused,
+        }
+
+        original_focus_map = dict(focus_map, **self.table.focus_map)
+
+        focus_map.update({
+            self.attr_focused: self.attr_column_focused,
+            self.attr_highlight_focused: self.attr_highlight_column_focused,
+        })
+        focus_map.update(self.table.column_focus_map)
+        focus_map.update(self.table.focus_map)
+        return (attr_map, original_focus_map, focus_map)
 
     def on_resize(self):
 
@@ -126,11 +183,9 @@ class DataTableRow(urwid.WidgetWrap):
 
     def enable_cell_selection(self):
         self.cell_selection = True
-        self.focus_map = self.cell_selection_focus_map
 
     def disable_cell_selection(self):
         self.cell_selection = False
-        self.focus_map = self.original_focus_map
 
     def resize_column(self, index, width):
         # col = self.table.visible_columns[index*2]
@@ -167,11 +222,29 @@ class DataTableRow(urwid.WidgetWrap):
         return self.contents_placeholder.original_widget
 
     def update(self):
+        self.layout_version = self.table._layout_version
+        self.width_version = self.table._width_version
         contents = self.make_contents()
         # if self.row_height is None:
         #     contents = urwid.Filler(contents)
         self.contents_placeholder.original_widget = contents
 
+    def update_layout(self):
+        self.update()
+        if self.table.width:
+            self.on_resize()
+
+    def update_widths(self):
+        self.width_version = self.table._width_version
+        for i, col in enumerate(self.table.visible_columns):
+            (widget, options) = self.columns.contents[i]
+            self.columns.contents[i] = (
+                widget,
+                self.columns.options(col.sizing, col.width_with_padding(self.padding))
+            )
+        if self.table.width:
+            self.on_resize()
+
     def selectable(self):
         return True
 
@@ -227,6 +300,10 @@ class DataTableDetails(urwid.WidgetWrap):
 
         super().__init__(self.columns)
 
+    def set_content(self, content):
+        self.contents = content
+        self.columns.contents[-1] = (content, self.columns.options("weight", 1))
+
     def selectable(self):
         return not self.row.details_disabled
 
@@ -246,26 +323,38 @@ class DataTableBodyRow(DataTableRow):
     def data(self):
         return AttrDict(self.table.get_dataframe_row(self.index))
 
+    @property
+    def view(self):
+        # lightweight alternative to data: reads values from the dataframe
+        # on access instead of copying the whole row
+        return self.table.df.get_row_view(self.index)
+
     @property
     def data_source(self):
         return self.table.get_dataframe_row_object(self.index)
 
     def __getattr__(self, attr):
+        # plain data columns are read from the dataframe; anything else
+        # (properties, methods, ...) comes from the row's data source object
+        if (attr not in DataTableDataFrame.DATA_TABLE_COLUMNS
+            and "table" in self.__dict__):
+            try:
+                return self.table.df.get_cell(self.index, attr)
+            except ValueError:
+                pass
         return object.__getattribute__(self.data_source, attr)
 
     def __getitem__(self, column):
-        cls = self.table.df[self.index, "_cls"]
-        # row = self.data
-        if column in self.table.df.columns:
-            # logger.info(f"__getitem__: {column}={self.table.df.get(self.index, column)}")
-            return self.table.df[self.index, column]
-        else:
-            raise KeyError
-            # raise Exception(column, self.table.df.columns)
+        try:
+            return self.table.df.get_cell(self.index, column)
+        except ValueError:
+            raise KeyError(column)
 
 
     def __setitem__(self, column, value):
         self.table.df[self.index, column] = value
+        self.table.update_search_indexes([self.index], column)
+        self.table.update_groups([self.index], column)
         # logger.info(f"__setitem__: {column}, {value}, {self.table.df[self.index, column]}")
 
     def get(self, key, default=None):
@@ -288,7 +377,7 @@ class DataTableBodyRow(DataTableRow):
 
     @property
     def details_disabled(self):
-        return (not self.table.detail_selectable) or self.get([self.index, "_details"], {}).get("disabled", False)
+        return (not self.table.detail_selectable) or (self.get("_details") or {}).get("disabled", False)
 
     @details_disabled.setter
     def details_disabled(self, value):
@@ -314,9 +403,9 @@ class DataTableBodyRow(DataTableRow):
 
     @property
     def details(self):
-        if not getattr(self, "_details", None):
+        if not self.__dict__.get("_details"):
 
-            content = self.table.detail_fn((self.data_source))
+            content = self.table.get_detail_content(self)
             logger.debug(f"open_details: {type(content)}")
             if not content:
                 return
@@ -348,6 +437,21 @@ class DataTableBodyRow(DataTableRow):
         return self._details
 
 
+    def update_details(self, content, keep=True):
+        # called when asynchronously loaded details arrive.  Content that
+        # isn't kept, e.g. an error message, is only shown until the details
+        # are closed: opening them again loads them again.
+        details = self.__dict__.get("_details")
+        if not details:
+            return
+        if content:
+            details.set_content(content)
+            if not keep:
+                self._details = None
+        else:
+            self.close_details()
+            self._details = None
+
     def open_details(self):
 
         if not self.table.detail_fn or not self.details or self.details_open:
@@ -396,6 +500,8 @@ class DataTableBodyRow(DataTableRow):
         return self.attrmap.get_attr_map().get(self.ATTR)
 
     def set_attr(self, attr):
+        # get_attr_map/get_focus_map return copies, so the shared maps
+        # aren't affected
         attr_map = self.attrmap.get_attr_map()
         attr_map[self.ATTR] = attr
         if self.cell_selection:
@@ -430,13 +536,15 @@ class DataTableBodyRow(DataTableRow):
 
     def make_cells(self):
 
+        data = self.view
+
         def col_to_attr(col):
             if col.attr is None:
                 return None
             if callable(col.attr):
-                return col.attr(self.data)
-            elif col.attr in self.data:
-                return self.data[col.attr]
+                return col.attr(data)
+            elif col.attr in data:
+                return data[col.attr]
             elif isinstance(col.attr, str):
                 return col.attr
             else:
@@ -455,6 +563,75 @@ class DataTableBodyRow(DataTableRow):
             else DataTableDividerBodyCell(self.table, col, self)
             for i, col in enumerate(self.table.visible_columns)]
 
+
+class DataTableGroupRow(DataTableRow):
+
+    ATTR = "table_row_group"
+
+    DIVIDER_CLASS = DataTableDividerGroupCell
+
+    EXPANDED_ICON = u"\N{BLACK DOWN-POINTING SMALL TRIANGLE}"
+    COLLAPSED_ICON = u"\N{BLACK RIGHT-POINTING SMALL TRIANGLE}"
+
+    details_open = False
+    details_focused = False
+
+    @property
+    def group(self):
+        return self.content
+
+    @property
+    def data(self):
+        return AttrDict(zip(self.table.group_by, self.group.key))
+
+    @property
+    def label_column(self):
+        columns = self.table.visible_data_columns
+        aggregates = self.table.group_aggregates or {}
+        return next(
+            (c.name for c in columns if c.name not in aggregates),
+            columns[0].name if columns else None
+        )
+
+    @property
+    def label(self):
+        return "%s %s (%d)" %(
+            self.EXPANDED_ICON if self.group.expanded else self.COLLAPSED_ICON,
+            ", ".join(str(k) for k in self.group.key),
+            len(self.group)
+        )
+
+    def group_value(self, column):
+        if column.name == self.label_column:
+            return self.label
+        fn = (self.table.group_aggregates or {}).get(column.name)
+        if fn is None:
+            return None
+        return self.group.aggregate(self.table.df, column.name, fn)
+
+    def make_cells(self):
+        return [
+            DataTableGroupCell(self.table, col, self)
+            if isinstance(col, DataTableColumn)
+            else DataTableDividerGroupCell(self.table, col, self)
+            for i, col in enumerate(self.table.visible_columns)]
+
+    def keypress(self, size, key):
+        key = super().keypress(size, key)
+        if key == "enter":
+            self.table.toggle_group(self.group)
+            return
+        return key
+
+    def open_details(self):
+        pass
+
+    def close_details(self):
+        pass
+
+    def toggle_details(self):
+        pass
+
 # class DataTableDetailRow(DataTableRow):
 
 #     ATTR = "table_row_detail"
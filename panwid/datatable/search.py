@@ -0,0 +1,25 @@
+from ..search import SearchIndex
+
+
+class DataTableSearchIndex(SearchIndex):
+    """
+    Search index over one DataTable column, keyed by dataframe index.  Values
+    are read from the table's dataframe and matched as the column formats
+    them.
+    """
+
+    def __init__(self, table, column):
+        self.table = table
+        self.column = column
+        super().__init__(
+            self.values(table.df.index),
+            table.column_named(column).format_value
+        )
+
+    def values(self, indexes):
+        return ((i, self.table.df.get_cell(i, self.column)) for i in indexes)
+
+    def update_rows(self, indexes):
+        self.update(self.values(indexes))
+
+__all__ = ["DataTableSearchIndex"]
@@ -0,0 +1,97 @@
+import time
+from collections import defaultdict
+
+import urwid
+
+
+class DataTableTimer(object):
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add_time(self.name, time.perf_counter() - self.start)
+
+
+class NullTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+NULL_TIMER = NullTimer()
+
+def timed(stats, name):
+    if stats is None:
+        return NULL_TIMER
+    return stats.timer(name)
+
+
+class DataTableStats(object):
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # name -> [calls, total seconds]
+        self.timers = defaultdict(lambda: [0, 0.0])
+        self.counters = defaultdict(int)
+
+    def timer(self, name):
+        return DataTableTimer(self, name)
+
+    def add_time(self, name, elapsed):
+        t = self.timers[name]
+        t[0] += 1
+        t[1] += elapsed
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def as_dict(self):
+        return dict(
+            timers = {
+                k: dict(calls=v[0], seconds=v[1])
+                for k, v in self.timers.items()
+            },
+            counters = dict(self.counters)
+        )
+
+    def format(self):
+        lines = [
+            "%-26s %7d %9.3fms" %(name, calls, total*1000)
+            for name, (calls, total) in sorted(
+                    self.timers.items(), key=lambda x: -x[1][1]
+            )
+        ]
+        lines += [
+            "%-26s %7d" %(name, value)
+            for name, value in sorted(self.counters.items())
+        ]
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.format()
+
+
+class DataTableStatsView(urwid.WidgetWrap):
+
+    def __init__(self, table):
+        self.table = table
+        self.text = urwid.Text("")
+        urwid.connect_signal(self.table, "stats", self.on_stats)
+        super().__init__(urwid.AttrMap(self.text, "table_message"))
+        if self.table.stats is not None:
+            self.on_stats(self.table, self.table.stats)
+
+    def on_stats(self, source, stats):
+        self.text.set_text(stats.format())
+
+__all__ = ["DataTableStats", "DataTableStatsView"]
@@ -0,0 +1,163 @@
+import logging
+logger = logging.getLogger("panwid.datatable")
+
+import os
+import csv
+import json
+import mmap
+import pickle
+from array import array
+
+from .dataframe import DataTableDataFrame
+
+
+class DataTableSnapshot(object):
+    """
+    Columnar on-disk snapshot of a DataTable's data.
+
+    A snapshot is a directory holding a small JSON metadata file plus two files
+    per column: a data file of concatenated pickled values and an offsets file
+    of len+1 unsigned 64-bit integers.  Both are memory-mapped on open, so
+    opening a snapshot costs nothing regardless of its size, and individual
+    values are only unpickled when a row is actually requested.
+
+    Snapshots are pickle-based, so only load ones you wrote yourself.
+    """
+
+    VERSION = 1
+    META_FILE = "meta.json"
+
+    def __init__(self, path):
+
+        self.path = path
+        with open(os.path.join(self.path, self.META_FILE), "r") as f:
+            meta = json.load(f)
+        if meta.get("version") != self.VERSION:
+            raise Exception("unsupported snapshot version: %s" %(meta.get("version")))
+        self.index_name = meta["index_name"]
+        self.columns = meta["columns"]
+        self.length = meta["length"]
+        self._files = []
+        self._maps = []
+        self._offsets = []
+        self._data = []
+        for i, c in enumerate(self.columns):
+            self._offsets.append(self._map("%d.off" %(i)).cast("Q"))
+            self._data.append(self._map("%d.dat" %(i)))
+
+    def _map(self, filename):
+        f = open(os.path.join(self.path, filename), "rb")
+        self._files.append(f)
+        if not os.fstat(f.fileno()).st_size:
+            return memoryview(b"")
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(m)
+        return memoryview(m)
+
+    @classmethod
+    def write(cls, path, df, columns=None):
+
+        if columns is None:
+            columns = [
+                c for c in df.columns
+                if c not in DataTableDataFrame.DATA_TABLE_COLUMNS
+                and c != df.index_name
+            ]
+        columns = [df.index_name] + columns
+
+        os.makedirs(path, exist_ok=True)
+        for i, c in enumerate(columns):
+            values = df.index if c == df.index_name else df.get_entire_column(c, as_list=True)
+            offsets = array("Q", [0])
+            with open(os.path.join(path, "%d.dat" %(i)), "wb") as f:
+                for v in values:
+                    offsets.append(offsets[-1] + f.write(pickle.dumps(v)))
+            with open(os.path.join(path, "%d.off" %(i)), "wb") as f:
+                offsets.tofile(f)
+
+        with open(os.path.join(path, cls.META_FILE), "w") as f:
+            json.dump(dict(
+                version = cls.VERSION,
+                index_name = df.index_name,
+                columns = columns,
+                length = len(df)
+            ), f)
+
+    def __len__(self):
+        return self.length
+
+    def get(self, position, column):
+        c = self.columns.index(column)
+        offsets = self._offsets[c]
+        return pickle.loads(self._data[c][offsets[position]:offsets[position+1]])
+
+    def row(self, position):
+        return {
+            c: pickle.loads(self._data[i][self._offsets[i][position]:self._offsets[i][position+1]])
+            for i, c in enumerate(self.columns)
+        }
+
+    def rows(self, offset=0, limit=None):
+        end = self.length if limit is None else min(offset + limit, self.length)
+        for position in range(offset, end):
+            yield self.row(position)
+
+    def query(self, offset=None, limit=None, load_all=False, **kwargs):
+        """
+        Rows in snapshot order.  A snapshot is read in the order it was
+        written, so it can't back a table that sorts or filters in its query
+        (query_sort or query_filter); DataTable.load() refuses those.  Other
+        tables sort and filter the rows they load themselves.
+        """
+        if load_all:
+            limit = None
+        return list(self.rows(offset or 0, limit))
+
+    def close(self):
+        for v in self._offsets + self._data:
+            v.release()
+        for m in self._maps:
+            m.close()
+        for f in self._files:
+            f.close()
+        self._offsets, self._data, self._maps, self._files = [], [], [], []
+
+
+def write_jsonl(f, rows, columns=None):
+    for row in rows:
+        f.write(json.dumps(row, default=repr))
+        f.write("\n")
+
+def read_jsonl(f):
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+def write_csv(f, rows, columns=None):
+    writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+
+def read_csv(f):
+    # values come back as strings, and empty values as None; DataTable
+    # converts them with the columns' types when importing
+    for row in csv.DictReader(f):
+        yield { k: (v if v != "" else None) for k, v in row.items() }
+
+STREAM_FORMATS = {
+    "jsonl": (write_jsonl, read_jsonl),
+    "csv": (write_csv, read_csv),
+}
+
+def stream_format(path, format=None):
+    if format is None:
+        format = os.path.splitext(path)[1].lstrip(".").lower()
+        if format == "json":
+            format = "jsonl"
+    try:
+        return STREAM_FORMATS[format]
+    except KeyError:
+        raise Exception("unsupported format: %s" %(format))
+
+__all__ = ["DataTableSnapshot"]
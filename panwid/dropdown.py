@@ -1,11 +1,13 @@
 import logging
 logger = logging.getLogger(__name__)
+import asyncio
 import os
 import random
 import string
 from functools import wraps
 import re
 import itertools
+from collections import OrderedDict
 
 import six
 import urwid
@@ -19,6 +21,24 @@ from .keymap import *
 from .highlightable import HighlightableTextMixin
 from .autocomplete import AutoCompleteMixin
 
+def casefold(s):
+    return s.casefold() if isinstance(s, str) else s
+
+class DropdownLabel(urwid.SelectableIcon):
+
+    _attrib_source = None
+
+    def set_attrib(self, attrib):
+        # only the attributes changed, so keep the cached line layout and
+        # just invalidate the canvas.  attrib is a shared, cached tuple, so
+        # the label gets its own list.
+        if attrib is self._attrib_source:
+            return
+        self._attrib_source = attrib
+        self._attrib = list(attrib)
+        urwid.Widget._invalidate(self)
+
+
 class DropdownButton(urwid.Button):
 
     text_attr = "dropdown_text"
@@ -41,17 +61,20 @@ class DropdownButton(urwid.Button):
         if right_chars:
             self.right_chars = right_chars
 
-        self.button_left = urwid.Text(self.left_chars)
-        self.button_right = urwid.Text(self.right_chars)
-
-        self._label = urwid.SelectableIcon("", cursor_position=0)
-        self.cols = urwid.Columns([
-            (len(self.left_chars), self.button_left),
-            ('weight', 1, self._label),
-            (len(self.right_chars), self.button_right)
-        ], dividechars=0)
+        self._label = DropdownLabel("", cursor_position=0)
+        w = self._label
+        # a dropdown can have thousands of these, so without decorations
+        # the label is wrapped directly rather than in a Columns
+        if self.left_chars or self.right_chars:
+            self.button_left = urwid.Text(self.left_chars)
+            self.button_right = urwid.Text(self.right_chars)
+            w = self.cols = urwid.Columns([
+                (len(self.left_chars), self.button_left),
+                ('weight', 1, self._label),
+                (len(self.right_chars), self.button_right)
+            ], dividechars=0)
         self.set_label((self.text_attr, self.label_text))
-        super(urwid.Button, self).__init__(self.cols)
+        super(urwid.Button, self).__init__(w)
 
     @property
     def decoration_width(self):
@@ -69,9 +92,10 @@ class DropdownItem(HighlightableTextMixin, urwid.WidgetWrap):
     text_attr = "dropdown_text"
     highlight_attr = "dropdown_highlight"
     focused_attr = "dropdown_focused"
+    margin = 0
 
     def __init__(self, label, value,
-                 margin=0,
+                 margin=None,
                  text_attr=None,
                  focused_attr=None,
                  highlight_attr=None,
@@ -79,7 +103,8 @@ class DropdownItem(HighlightableTextMixin, urwid.WidgetWrap):
 
         self.label_text = label
         self.value = value
-        self.margin = margin
+        if margin:
+            self.margin = margin
         if text_attr:
             self.text_attr = text_attr
         if focused_attr:
@@ -92,16 +117,17 @@ class DropdownItem(HighlightableTextMixin, urwid.WidgetWrap):
             left_chars=left_chars, right_chars=right_chars
         )
 
-        self.padding = urwid.Padding(self.button, width=("relative", 100),
-                                     left=self.margin, right=self.margin)
-
+        w = self.button
+        if self.margin:
+            w = urwid.Padding(w, width=("relative", 100),
+                              left=self.margin, right=self.margin)
 
-        self.attr = urwid.AttrMap(self.padding, {None: self.text_attr})
-        self.attr.set_focus_map({
+        w = urwid.AttrMap(w, {None: self.text_attr})
+        w.set_focus_map({
             None: self.focused_attr,
             self.text_attr: self.focused_attr
         })
-        super(DropdownItem, self).__init__(self.attr)
+        super(DropdownItem, self).__init__(w)
         urwid.connect_signal(
             self.button,
             "click",
@@ -121,10 +147,10 @@ class DropdownItem(HighlightableTextMixin, urwid.WidgetWrap):
         return self.highlight_attr
 
     def on_highlight(self):
-        self.set_text(self.highlight_content)
+        self.button._label.set_attrib(self.get_highlight_attrib())
 
     def on_unhighlight(self):
-        self.set_text(self.highlight_source)
+        self.button._label.set_attrib(self.get_highlight_attrib())
 
     @property
     def width(self):
@@ -150,6 +176,218 @@ class DropdownItem(HighlightableTextMixin, urwid.WidgetWrap):
     def set_text(self, text):
         self.button.set_label(text)
 
+    def set_item(self, label, value):
+        # reuse this widget for a different item
+        if self.highlight_state:
+            self._highlight_state = False
+            self._highlight_location = None
+            self._highlight_spans = None
+        self.label_text = self.button.label_text = label
+        self.value = value
+        self.button.set_label((self.text_attr, label))
+
+
+class DropdownItemWalker(urwid.ListWalker):
+    """
+    List walker over dropdown items that only creates DropdownItem widgets
+    for positions that are actually displayed.
+
+    items can be a mapping of labels to values, a list of labels or
+    (label, value) tuples, or a callable returning one of those, which isn't
+    called until the items are first needed.  Widgets are kept in a small LRU
+    cache; once it's full, the least recently used widget is recycled for
+    the next position instead of building a new one.
+
+    set_filter() restricts the walker to a subset of the items, in any
+    order.  Positions are then positions in that view; item_position() maps
+    them back to indexes into labels and values.  Widgets are cached by item
+    index, so items that stay visible keep their widgets.
+    """
+
+    cache_size = 256
+
+    def __init__(self, items, make_item, cache_size=None):
+        self.make_item = make_item
+        if cache_size is not None: self.cache_size = cache_size
+        self._widgets = OrderedDict()
+        # bumped whenever the items change, for anything sized by them
+        self.version = 0
+        self.set_items(items)
+
+    def set_items(self, items):
+        self._source = items
+        self._labels = None
+        self._values = None
+        self._items = None
+        self._label_positions = None
+        self._folded_positions = None
+        self._value_positions = None
+        self._max_label_width = None
+        self._view = None
+        self._widgets.clear()
+        self.focus = 0
+        self.version += 1
+        self._modified()
+
+    def set_filter(self, positions):
+        # positions is a list of item indexes to show, or None to show all
+        # of them.  Focus stays on the same item if it's still visible.
+        focused = self.item_position(self.focus) if len(self) else None
+        self._view = positions
+        if focused is None:
+            self.focus = 0
+        elif positions is None:
+            self.focus = focused
+        else:
+            try:
+                self.focus = positions.index(focused)
+            except ValueError:
+                self.focus = 0
+        self._modified()
+
+    @property
+    def filtered(self):
+        return self._view is not None
+
+    def item_position(self, position):
+        if self._view is None:
+            return position
+        return self._view[position]
+
+    def load(self):
+        items = self._source
+        if callable(items):
+            items = items()
+        if items is None:
+            labels, values = [], []
+        elif hasattr(items, "keys"):
+            labels, values = list(items.keys()), list(items.values())
+        else:
+            items = list(items)
+            if len(items) and isinstance(items[0], tuple):
+                labels = [ l for l, v in items ]
+                values = [ v for l, v in items ]
+            else:
+                labels, values = items, list(range(len(items)))
+        self._labels = labels
+        self._values = values
+
+    def extend(self, items):
+        # append (label, value) tuples, e.g. the next page of a query
+        items = list(items)
+        self.labels.extend(l for l, v in items)
+        self.values.extend(v for l, v in items)
+        self._items = None
+        self._label_positions = None
+        self._folded_positions = None
+        self._value_positions = None
+        if self._max_label_width is not None:
+            self._max_label_width = max(
+                [self._max_label_width] + [ len(l) for l, v in items ]
+            )
+        self.version += 1
+        self._modified()
+
+    @property
+    def labels(self):
+        if self._labels is None:
+            self.load()
+        return self._labels
+
+    @property
+    def values(self):
+        if self._values is None:
+            self.load()
+        return self._values
+
+    @property
+    def items(self):
+        if self._items is None:
+            self._items = AttrDict(zip(self.labels, self.values))
+        return self._items
+
+    @property
+    def max_label_width(self):
+        if self._max_label_width is None:
+            self._max_label_width = max((len(l) for l in self.labels), default=0)
+        return self._max_label_width
+
+    def positions_by(self, keys):
+        # first position of each key, like a linear search would find
+        d = {}
+        for i, k in enumerate(keys):
+            d.setdefault(k, i)
+        return d
+
+    def label_position(self, label, case_sensitive=False):
+        if case_sensitive:
+            if self._label_positions is None:
+                self._label_positions = self.positions_by(self.labels)
+            return self._label_positions[label]
+        if self._folded_positions is None:
+            self._folded_positions = self.positions_by(
+                casefold(l) for l in self.labels
+            )
+        return self._folded_positions[casefold(label)]
+
+    def value_position(self, value):
+        if self._value_positions is None:
+            try:
+                self._value_positions = self.positions_by(self.values)
+            except TypeError:
+                # unhashable values
+                self._value_positions = False
+        try:
+            if self._value_positions is not False:
+                return self._value_positions[value]
+            return self.values.index(value)
+        except (TypeError, ValueError):
+            raise KeyError(value)
+
+    def __len__(self):
+        if self._view is not None:
+            return len(self._view)
+        return len(self.labels)
+
+    def __getitem__(self, position):
+        if position < 0 or position >= len(self):
+            raise IndexError
+        index = self.item_position(position)
+        try:
+            widget = self._widgets[index]
+            self._widgets.move_to_end(index)
+            return widget
+        except KeyError:
+            pass
+        label, value = self.labels[index], self.values[index]
+        if len(self._widgets) >= self.cache_size:
+            _, widget = self._widgets.popitem(last=False)
+            widget.set_item(label, value)
+        else:
+            widget = self.make_item(label, value)
+        self._widgets[index] = widget
+        return widget
+
+    def positions(self, reverse=False):
+        if reverse:
+            return range(len(self) - 1, -1, -1)
+        return range(len(self))
+
+    def next_position(self, position):
+        if position >= len(self) - 1:
+            raise IndexError
+        return position + 1
+
+    def prev_position(self, position):
+        if position <= 0:
+            raise IndexError
+        return position - 1
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+
+
 @keymapped()
 class DropdownDialog(AutoCompleteMixin, urwid.WidgetWrap, KeymapMovementMixin):
 
@@ -164,6 +402,14 @@ class DropdownDialog(AutoCompleteMixin, urwid.WidgetWrap, KeymapMovementMixin):
     scrollbar = False
     margin = 0
     max_height = None
+    filter_delay = None
+    items_fn = None
+    # delays used when filter_delay isn't given; filter_delay=0 filters on
+    # every keystroke
+    default_filter_delay = 0.05
+    items_filter_delay = 0.1
+    items_limit = 100
+    items_cache_size = 100
 
     def __init__(
             self,
@@ -182,12 +428,14 @@ class DropdownDialog(AutoCompleteMixin, urwid.WidgetWrap, KeymapMovementMixin):
             left_chars_top=None,
             rigth_chars_top=None,
             max_height=None,
+            filter_delay=None,
+            items_fn=None,
+            items_limit=None,
             keymap = {},
             **kwargs
     ):
 
         self.drop_down = drop_down
-        self.items = items
         if label is not None: self.label = label
         if border is not None: self.border = border
         if margin is not None: self.margin = margin
@@ -199,22 +447,29 @@ class DropdownDialog(AutoCompleteMixin, urwid.WidgetWrap, KeymapMovementMixin):
         if prompt_attr:
             self.prompt_attr = prompt_attr
         if max_height is not None: self.max_height = max_height
+        if filter_delay is not None: self.filter_delay = filter_delay
+        if items_fn is not None: self.items_fn = items_fn
+        if items_limit is not None: self.items_limit = items_limit
+        self.left_chars = left_chars
+        self.right_chars = right_chars
         self.selected_button = 0
-        buttons = []
-
-        buttons = [
-                DropdownItem(
-                    label=l, value=v, margin=self.margin,
-                    text_attr=self.text_attr,
-                    focused_attr=self.focused_attr,
-                    left_chars=left_chars,
-                    right_chars=right_chars,
-                )
-                for l, v in self.items.items()
-        ]
+        self.complete_filtering = False
+        self._filter_handle = None
+        self.items_query = None
+        self._items_cache = OrderedDict()
+        self._items_task = None
+
         self.dropdown_buttons = ScrollingListBox(
-            urwid.SimpleListWalker(buttons), with_scrollbar=scrollbar
+            DropdownItemWalker(items, self.make_item),
+            infinite=self.items_fn is not None,
+            with_scrollbar=scrollbar,
+            coalesce_movement=True
         )
+        if self.items_fn:
+            urwid.connect_signal(
+                self.dropdown_buttons, "load_more", self.load_more
+            )
+            self.query_items("")
 
         urwid.connect_signal(
             self.dropdown_buttons,
@@ -251,13 +506,174 @@ class DropdownDialog(AutoCompleteMixin, urwid.WidgetWrap, KeymapMovementMixin):
 
     @property
     def complete_items(self):
-        return self.body
+        return self.body.labels
+
+    @property
+    def complete_labels(self):
+        return self.body.labels
+
+    @keymap_command()
+    def complete_filter(self):
+        self.complete_on(anywhere=True, filtering=True)
+
+    def complete_on(self, *args, filtering=False, **kwargs):
+        if not self.completing:
+            self.complete_filtering = filtering
+        super().complete_on(*args, **kwargs)
+
+    @keymap_command
+    def complete(self, step=None, no_wrap=False):
+        if not (self.complete_filtering or self.items_fn):
+            return super().complete(step=step, no_wrap=no_wrap)
+        if not self.completing:
+            return
+        if step:
+            self.cycle_position(step)
+        elif not (self.filter_text and self.schedule_filter()):
+            self.apply_filter()
+
+    def schedule_filter(self):
+        # recompute once typing pauses rather than on every keystroke.  Only
+        # done while an asyncio loop is running, so direct calls still filter
+        # immediately.
+        delay = self.filter_delay
+        if delay is None:
+            delay = (self.items_filter_delay if self.items_fn
+                     else self.default_filter_delay)
+        if not delay:
+            return False
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        if self._filter_handle:
+            self._filter_handle.cancel()
+        self._filter_handle = loop.call_later(delay, self.apply_filter)
+        return True
+
+    def apply_filter(self):
+        self._filter_handle = None
+        text = self.filter_text
+        if self.items_fn:
+            self.query_items(text)
+            return
+        if not text:
+            self.body.set_filter(None)
+            return
+        if self.complete_fuzzy:
+            positions = self.fuzzy_index.search(text)
+        else:
+            positions = self.complete_matches(text)
+        self.body.set_filter(positions)
+        if len(self.body):
+            self.focus_position = 0
+
+    def query_items(self, text):
+        # show the items items_fn returns for text, from the cache if they've
+        # been fetched before
+        self.items_query = text
+        try:
+            items, exhausted = self._items_cache[text]
+            self._items_cache.move_to_end(text)
+        except KeyError:
+            self.body.set_items([])
+            self.fetch_items(text, 0)
+            return
+        self.body.set_items(items)
+
+    def fetch_items(self, text, offset):
+        if self._items_task:
+            # the query it's running is no longer wanted
+            self._items_task.cancel()
+            self._items_task = None
+        if asyncio.iscoroutinefunction(self.items_fn):
+            self._items_task = asyncio.get_event_loop().create_task(
+                self._fetch_items_async(text, offset)
+            )
+        else:
+            self.add_items(
+                text, offset, self.items_fn(text, offset, self.items_limit)
+            )
+
+    async def _fetch_items_async(self, text, offset):
+        try:
+            items = await self.items_fn(text, offset, self.items_limit)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # nothing is cached, so the query is retried the next time it's
+            # entered
+            logger.exception("items_fn failed for %r", text)
+            return
+        finally:
+            if self._items_task is asyncio.current_task():
+                self._items_task = None
+        self.add_items(text, offset, items)
+
+    def add_items(self, text, offset, items):
+
+        if hasattr(items, "items"):
+            items = list(items.items())
+        else:
+            items = [ i if isinstance(i, tuple) else (i, i) for i in items ]
+
+        cached, exhausted = self._items_cache.get(text, ([], False))
+        if offset != len(cached):
+            return
+        self._items_cache[text] = (cached + items, len(items) < self.items_limit)
+        self._items_cache.move_to_end(text)
+        while len(self._items_cache) > self.items_cache_size:
+            self._items_cache.popitem(last=False)
+
+        if text == self.items_query:
+            self.body.extend(items)
+
+    def load_more(self, position=None):
+        if self._items_task:
+            return
+        cached, exhausted = self._items_cache.get(self.items_query, ([], True))
+        if not exhausted:
+            self.fetch_items(self.items_query, len(cached))
+
+    def invalidate_items(self):
+        self._items_cache.clear()
+        if self.items_query is not None:
+            self.query_items(self.items_query)
+
+    def complete_off(self):
+        if self._filter_handle:
+            self._filter_handle.cancel()
+            self._filter_handle = None
+        super().complete_off()
+        if self.body.filtered:
+            self.body.set_filter(None)
+        self.complete_filtering = False
+
+    def make_item(self, label, value):
+        return DropdownItem(
+            label=label, value=value, margin=self.margin,
+            text_attr=self.text_attr,
+            focused_attr=self.focused_attr,
+            left_chars=self.left_chars,
+            right_chars=self.right_chars,
+        )
+
+    @property
+    def items(self):
+        return self.body.items
+
+    @property
+    def item_decoration_width(self):
+        return (len(self.left_chars or "") + len(self.right_chars or "")
+                + 2*self.margin)
 
     @property
     def max_item_width(self):
-        if not len(self):
+        # measured from the labels so widgets don't need to be built, and
+        # cached by the walker until the items change
+        if not len(self.body.labels):
             return self.min_width
-        return max(w.width for w in self)
+        return self.body.max_label_width + self.item_decoration_width
 
     @property
     def width(self):
@@ -268,7 +684,8 @@ class DropdownDialog(AutoCompleteMixin, urwid.WidgetWrap, KeymapMovementMixin):
 
     @property
     def height(self):
-        height = min(len(self), self.max_height)
+        # sized for all of the items, so filtering doesn't resize the pop-up
+        height = min(len(self.body.labels), self.max_height)
         if self.border:
             height += 2
         return height
@@ -332,6 +749,7 @@ class Dropdown(urwid.PopUpLauncher):
     auto_complete = None
     label = None
     empty_label = u"\N{EMPTY SET}"
+    _items = None
     expanded = False
     margin = 0
 
@@ -352,6 +770,9 @@ class Dropdown(urwid.PopUpLauncher):
             left_chars_top=None, right_chars_top=None,
             auto_complete=None,
             max_height=10,
+            filter_delay=None,
+            items_fn=None,
+            items_limit=None,
             # keymap = {}
     ):
 
@@ -362,6 +783,7 @@ class Dropdown(urwid.PopUpLauncher):
         if expanded is not None:
             self.expanded = expanded
         self.default = default
+        self._pop_up_parameters = None
 
         self.border = border
         self.scrollbar = scrollbar
@@ -383,18 +805,6 @@ class Dropdown(urwid.PopUpLauncher):
         if prompt_attr:
             self.prompt_attr = prompt_attr
 
-        if isinstance(self.items, list):
-            if len(self.items):
-                if isinstance(self.items[0], tuple):
-                    self._items = AttrDict(self.items)
-                else:
-                    logger.debug(self.items)
-                    self._items = AttrDict(( (item, n) for n, item in enumerate(self.items)))
-            else:
-                self._items = AttrDict()
-        else:
-            self._items = self.items
-
 
         self.button = DropdownItem(
             u"", None,
@@ -421,6 +831,9 @@ class Dropdown(urwid.PopUpLauncher):
             auto_complete=self.auto_complete,
             scrollbar=scrollbar,
             max_height=max_height,
+            filter_delay=filter_delay,
+            items_fn=items_fn,
+            items_limit=items_limit,
             # keymap=self.KEYMAP
         )
 
@@ -524,6 +937,20 @@ class Dropdown(urwid.PopUpLauncher):
         self.open_pop_up()
         self.pop_up.complete_substring()
 
+    @keymap_command()
+    def complete_fuzzy(self):
+        if not self.auto_complete:
+            return
+        self.open_pop_up()
+        self.pop_up.complete_fuzzy()
+
+    @keymap_command()
+    def complete_filter(self):
+        if not self.auto_complete:
+            return
+        self.open_pop_up()
+        self.pop_up.complete_filter()
+
     def create_pop_up(self):
         # print("create")
         return self.pop_up
@@ -574,11 +1001,18 @@ class Dropdown(urwid.PopUpLauncher):
         super().close_pop_up()
 
     def get_pop_up_parameters(self):
-        return {'left': (len(self.label) + 2 if self.label else 0),
+        # items can arrive at any time, e.g. from items_fn, so the cached
+        # parameters are only good for the items they were computed for
+        version = self.pop_up.body.version
+        if (self._pop_up_parameters is None
+            or self._pop_up_parameters[0] != version):
+            self._pop_up_parameters = (version, {
+                'left': (len(self.label) + 2 if self.label else 0),
                 'top': 0,
                 'overlay_width': self.pop_up_width,
                 'overlay_height': self.pop_up.height
-        }
+            })
+        return self._pop_up_parameters[1]
 
     @property
     def focus_position(self):
@@ -595,32 +1029,7 @@ class Dropdown(urwid.PopUpLauncher):
 
     @property
     def items(self):
-        return self._items
-
-    @property
-    def selection(self):
-        return self.pop_up.selection
-
-    def select_label(self, label, case_sensitive=False):
-
-        old_value = self.value
-
-        f = lambda x: x
-        if not case_sensitive:
-            f = lambda x: x.lower()
-
-        index = next(itertools.dropwhile(
-                lambda x: f(x[1]) != f(label),
-                enumerate((self._items.keys())
-            )
-        ))[0]
-        self.focus_position = index
-
-
-
-    @property
-    def items(self):
-        return self._items
+        return self.pop_up.items
 
     @property
     def selection(self):
@@ -629,41 +1038,29 @@ class Dropdown(urwid.PopUpLauncher):
 
     def select_label(self, label, case_sensitive=False):
 
-        old_value = self.value
-
-        f = lambda x: x
-        if not case_sensitive:
-            f = lambda x: x.lower() if isinstance(x, str) else x
-
         try:
-            index = next(itertools.dropwhile(
-                    lambda x: f(x[1]) != f(label),
-                    enumerate((self._items.keys())
-                )
-            ))[0]
-        except StopIteration:
+            index = self.pop_up.body.label_position(label, case_sensitive)
+        except KeyError:
             raise ValueError
         self.focus_position = index
 
 
-
     def select_value(self, value):
 
-        index = next(itertools.dropwhile(
-                lambda x: x[1] != value,
-                enumerate((self._items.values())
-            )
-        ))[0]
+        try:
+            index = self.pop_up.body.value_position(value)
+        except KeyError:
+            raise StopIteration
         self.focus_position = index
 
 
     @property
     def labels(self):
-        return self._items.keys()
+        return self.pop_up.body.labels
 
     @property
     def values(self):
-        return self._items.values()
+        return self.pop_up.body.values
 
     @property
     def selected_label(self):
@@ -721,12 +1118,27 @@ class Dropdown(urwid.PopUpLauncher):
         self.action()
         self._emit("change", self.selected_label, self.selected_value)
 
-    # def set_items(self, items, selected_value):
-    #     self._items = items
-    #     self.make_selection([label for (label, value) in items if
-    #                          value is selected_value][0],
-    #                         selected_value)
+    def set_items(self, items, selected_value=None):
+
+        self._items = items
+        self.pop_up.body.set_items(items)
+        pos = 0
+        if selected_value is not None:
+            try:
+                pos = self.pop_up.body.value_position(selected_value)
+            except KeyError:
+                pass
+        self.pop_up.selected_button = self.pop_up.focus_position = pos
+        if len(self):
+            self.select(self.selection)
+        else:
+            self.button.set_text((self.text_attr, self.empty_label))
+        self.columns.contents[-1] = (
+            self.button, self.columns.options("given", self.button_width)
+        )
+        self.original_widget.width = self.width
+
     def __len__(self):
-        return len(self.items)
+        return len(self.pop_up)
 
 __all__ = ["Dropdown"]
@@ -1,5 +1,38 @@
 import logging
 logger = logging.getLogger(__name__)
+import functools
+
+# Highlights are recomputed on every completion step, but the same label
+# and spans come up over and over, so both forms are cached.  They return
+# tuples, since every caller gets the same object back.
+
+@functools.lru_cache(maxsize=1024)
+def highlight_attrib(length, spans, attr_normal, attr_highlight):
+    # attribute run-lengths for text of the given length
+    attrib = []
+    last = 0
+    for start, end in spans:
+        if start > last:
+            attrib.append((attr_normal, start - last))
+        if end > start:
+            attrib.append((attr_highlight, end - start))
+        last = end
+    if length > last:
+        attrib.append((attr_normal, length - last))
+    return tuple(attrib)
+
+@functools.lru_cache(maxsize=1024)
+def highlight_markup(source, spans, attr_normal, attr_highlight):
+    markup = []
+    last = 0
+    for start, end in spans:
+        markup += [
+            (attr_normal, source[last:start]),
+            (attr_highlight, source[start:end])
+        ]
+        last = end
+    markup.append((attr_normal, source[last:]))
+    return tuple(markup)
 
 class HighlightableTextMixin(object):
 
@@ -20,13 +53,18 @@ class HighlightableTextMixin(object):
 
 
     def highlight(self, start, end):
+        self.highlight_spans([(start, end)])
+
+    def highlight_spans(self, spans):
         self._highlight_state = True
-        self._highlight_location = (start, end)
+        self._highlight_spans = tuple(spans)
+        self._highlight_location = (spans[0][0], spans[-1][1]) if spans else None
         self.on_highlight()
 
     def unhighlight(self):
         self._highlight_state = False
         self._highlight_location = None
+        self._highlight_spans = None
         self.on_unhighlight()
 
     def get_highlight_text(self):
@@ -34,11 +72,20 @@ class HighlightableTextMixin(object):
         if not self._highlight_location:
             return None
 
-        return [
-            (self.highlightable_attr_normal, self.highlight_source[:self._highlight_location[0]]),
-            (self.highlightable_attr_highlight, self.highlight_source[self._highlight_location[0]:self._highlight_location[1]]),
-            (self.highlightable_attr_normal, self.highlight_source[self._highlight_location[1]:]),
-        ]
+        # urwid reads a tuple as a single (attr, text) pair, so markup has
+        # to be a list
+        return list(highlight_markup(
+            self.highlight_source, self._highlight_spans,
+            self.highlightable_attr_normal, self.highlightable_attr_highlight
+        ))
+
+    def get_highlight_attrib(self):
+
+        return highlight_attrib(
+            len(self.highlight_source),
+            self._highlight_spans if self.highlight_state else (),
+            self.highlightable_attr_normal, self.highlightable_attr_highlight
+        )
 
     @property
     def highlight_source(self):
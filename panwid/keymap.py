@@ -10,6 +10,15 @@ import re
 
 KEYMAP_GLOBAL = {}
 
+# Compiled key dispatch tables are rebuilt when this changes.  Replacing
+# KEYMAP_GLOBAL is noticed automatically; after changing it in place, call
+# keymap_invalidate().
+_keymap_version = 0
+
+def keymap_invalidate():
+    global _keymap_version
+    _keymap_version += 1
+
 _camel_snake_re_1 = re.compile(r'(.)([A-Z][a-z]+)')
 _camel_snake_re_2 = re.compile('([a-z0-9])([A-Z])')
 
@@ -73,79 +82,136 @@ def keymapped():
             if hasattr(getattr(cls, k), '_keymap')
         })
 
-        def keymap_command(self, cmd):
-            logger.debug(f"keymap_command: {cmd}")
+        scope = cls.KEYMAP_SCOPE()
+
+        def keymap_parse(self, cmd):
+            # (method name or callable, args, kwargs) for a keymap command
             args = []
             kwargs = {}
 
             if callable(cmd):
-                f = cmd
-            else:
-                if isinstance(cmd, tuple):
-                    if len(cmd) == 3:
-                        (cmd, args, kwargs) = cmd
-                    elif len(cmd) == 2:
-                        if isinstance(cmd[1], dict):
-                            (cmd, kwargs) = cmd
-                        else:
-                            (cmd, args) = cmd
+                return (cmd, args, kwargs)
+
+            if isinstance(cmd, tuple):
+                if len(cmd) == 3:
+                    (cmd, args, kwargs) = cmd
+                elif len(cmd) == 2:
+                    if isinstance(cmd[1], dict):
+                        (cmd, kwargs) = cmd
                     else:
-                        raise Exception
-                elif isinstance(cmd, str):
-                    cmd = cmd.replace(" ", "_")
-                else:
-                    logger.debug(f"keymap command {cmd} not valid")
-                    return None
-
-                if hasattr(self, cmd):
-                    fn_name = cmd
+                        (cmd, args) = cmd
                 else:
-                    try:
-                        fn_name = self.KEYMAP_MAPPING[cmd]
-                    except KeyError:
-                        raise KeyError(cmd, self.KEYMAP_MAPPING, type(self))
-
-                f = getattr(self, fn_name)
+                    raise Exception
+            elif isinstance(cmd, str):
+                cmd = cmd.replace(" ", "_")
+            else:
+                logger.debug("keymap command %s not valid", cmd)
+                return None
 
+            if hasattr(self, cmd):
+                fn_name = cmd
+            else:
+                try:
+                    fn_name = self.KEYMAP_MAPPING[cmd]
+                except KeyError:
+                    raise KeyError(cmd, self.KEYMAP_MAPPING, type(self))
+            return (fn_name, args, kwargs)
+
+        def keymap_call(self, f, args, kwargs):
+            if not callable(f):
+                # bound methods are cached per widget
+                try:
+                    bound = self.__dict__["_keymap_bound"]
+                except KeyError:
+                    bound = self.__dict__["_keymap_bound"] = {}
+                try:
+                    f = bound[f]
+                except KeyError:
+                    f = bound[f] = getattr(self, f)
             ret = f(*args, **kwargs)
             if asyncio.iscoroutine(ret):
                 asyncio.get_event_loop().create_task(ret)
             return None
 
+        def keymap_command(self, cmd):
+            logger.debug("keymap_command: %s", cmd)
+            command = keymap_parse(self, cmd)
+            if command is None:
+                return None
+            return keymap_call(self, *command)
+
         cls._keymap_command = keymap_command
 
         def keymap_register(self, key, cmd):
             self.KEYMAP_MERGED[cls.KEYMAP_SCOPE()][key] = cmd
+            keymap_invalidate()
 
         cls.keymap_register = keymap_register
 
+        # per widget type: (keymap it was built from, version, {key: entry})
+        tables = {}
+
+        def keymap_dispatch(self, key):
+            # Entries are a key to remap to, a parsed command, or None.  The
+            # global keymap replaces a scope's keymap entirely.
+            keymap = KEYMAP_GLOBAL.get(scope)
+            if keymap is None:
+                keymap = self.KEYMAP_MERGED.get(scope, {})
+            try:
+                source, version, table = tables[type(self)]
+            except KeyError:
+                source = None
+            if source is not keymap or version != _keymap_version:
+                table = {}
+                tables[type(self)] = (keymap, _keymap_version, table)
+            try:
+                return table[key]
+            except KeyError:
+                pass
+
+            cmd = keymap.get(key, None)
+            if not cmd:
+                entry = None
+            elif isinstance(cmd, str) and cmd.startswith("keypress "):
+                entry = cmd.replace("keypress ", "").strip()
+            else:
+                entry = keymap_parse(self, cmd)
+            table[key] = entry
+            return entry
+
         def keypress_decorator(func):
 
 
             def keypress(self, size, key):
-                logger.debug(f"{cls} wrapped keypress: {key}, {cls.KEYMAP_SCOPE()}, {self.KEYMAP_MERGED.get(cls.KEYMAP_SCOPE(), {}).keys()}")
+                debug = logger.isEnabledFor(logging.DEBUG)
+                if debug:
+                    logger.debug("%s wrapped keypress: %s, %s", cls, key, scope)
 
                 if key and callable(func):
-                    logger.debug(f"{cls} wrapped keypress, key: {key}, calling orig: {func}")
+                    if debug:
+                        logger.debug("%s wrapped keypress, key: %s, calling orig: %s", cls, key, func)
                     key = func(self, size, key)
                 if key:
-                    logger.debug(f"{cls} wrapped keypress, key: {key}, calling super: {super(cls, self).keypress}")
+                    if debug:
+                        logger.debug("%s wrapped keypress, key: %s, calling super", cls, key)
                     key = super(cls, self).keypress(size, key)
-                keymap_combined = dict(self.KEYMAP_MERGED, **KEYMAP_GLOBAL)
-                if key and keymap_combined.get(cls.KEYMAP_SCOPE(), {}).get(key, None):
-                    cmd = keymap_combined[cls.KEYMAP_SCOPE()][key]
-                    if isinstance(cmd, str) and cmd.startswith("keypress "):
-                        new_key = cmd.replace("keypress ", "").strip()
-                        logger.debug(f"{cls} remap {key} => {new_key}")
-                        key = new_key
-                    else:
-                        logger.debug(f"{cls} wrapped keypress, key: {key}, calling keymap command")
-                        key = self._keymap_command(cmd)
+                if key:
+                    entry = keymap_dispatch(self, key)
+                    if isinstance(entry, str):
+                        if debug:
+                            logger.debug("%s remap %s => %s", cls, key, entry)
+                        key = entry
+                    elif entry:
+                        if debug:
+                            logger.debug("%s wrapped keypress, key: %s, calling keymap command", cls, key)
+                        key = keymap_call(self, *entry)
                 return key
 
             return keypress
 
-        cls.keypress = keypress_decorator(getattr(cls, "keypress", None))
+        # an inherited keypress is what super() reaches anyway, so only wrap
+        # one the class defines itself, or unhandled keys go down twice
+        cls.keypress = keypress_decorator(cls.__dict__.get("keypress", None))
         return cls
 
     return wrapper
@@ -191,5 +257,6 @@ class KeymapMovementMixin(object):
 __all__ = [
     "keymapped",
     "keymap_command",
+    "keymap_invalidate",
     "KeymapMovementMixin"
 ]
@@ -1,6 +1,7 @@
 from __future__ import division
 import logging
 logger = logging.getLogger(__name__.split(".")[0])
+import asyncio
 
 import urwid
 from urwid_utils.palette import *
@@ -17,19 +18,22 @@ class ListBoxScrollBar(urwid.WidgetWrap):
         width, height = size
         scroll_marker_height = 1
         del self.pile.contents[:]
+        row_count = self.parent.row_count
         if (len(self.parent.body)
-            and self.parent.row_count
+            and row_count
             and self.parent.focus is not None
-            and self.parent.row_count > height):
+            and row_count > height):
             scroll_position = int(
-                self.parent.focus_position / self.parent.row_count * height
+                self.parent.focus_position / row_count * height
             )
-            scroll_marker_height = max( height * (height / self.parent.row_count ), 1)
+            scroll_marker_height = max( height * (height / row_count ), 1)
         else:
             scroll_position = 0
 
         pos_marker = urwid.AttrMap(urwid.Text(" "),
-                                   {None: "scroll_pos"}
+                                   {None: "scroll_pos_estimated"
+                                    if self.parent.row_count_estimated
+                                    else "scroll_pos"}
         )
 
         down_marker = urwid.AttrMap(urwid.Text(u"\N{DOWNWARDS ARROW}"),
@@ -56,7 +60,7 @@ class ListBoxScrollBar(urwid.WidgetWrap):
             if abs( i - scroll_position ) <= scroll_marker_height//2:
                 if i == 0 and self.parent.focus_position == 0:
                     marker = begin_marker
-                elif i+1 == height and self.parent.row_count == self.parent.focus_position+1:
+                elif i+1 == height and row_count == self.parent.focus_position+1:
                     marker = end_marker
                 elif self.parent.focus_position is not None and len(self.parent.body) == self.parent.focus_position+1 and i == scroll_position + scroll_marker_height//2:
                     marker = down_marker
@@ -65,7 +69,7 @@ class ListBoxScrollBar(urwid.WidgetWrap):
             else:
                 if i < scroll_position:
                     marker = view_marker
-                elif self.parent.row_count and i/height < ( len(self.parent.body) / self.parent.row_count):
+                elif row_count and i/height < ( len(self.parent.body) / row_count):
                     marker = view_marker
                 else:
                     marker = bg_marker
@@ -86,10 +90,21 @@ class ScrollingListBox(urwid.WidgetWrap):
 
     scrollbar_class = ScrollBar
 
+    # movement commands that can be coalesced, and their direction
+    MOVEMENT_COMMANDS = {
+        "cursor up": -1,
+        "cursor down": 1,
+        "cursor page up": -1,
+        "cursor page down": 1,
+    }
+
+    coalesce_movement = False
+
     def __init__(self, body,
                  infinite = False,
                  with_scrollbar=False,
                  row_count_fn = None,
+                 coalesce_movement=None,
                  thumb_char=None,
                  trough_char=None,
                  thumb_indicator_top=None,
@@ -98,7 +113,7 @@ class ScrollingListBox(urwid.WidgetWrap):
         self.infinite = infinite
         self.with_scrollbar = with_scrollbar
         self.row_count_fn = row_count_fn
-
+        if coalesce_movement is not None: self.coalesce_movement = coalesce_movement
         self._width = None
         self._height = 0
         self._rows_max = None
@@ -111,6 +126,12 @@ class ScrollingListBox(urwid.WidgetWrap):
         self.page = 0
 
         self.queued_keypress = None
+        self._scrollbar_dirty = False
+        # (command, size, focus position, count) of repeated movement keys
+        # not applied yet, and whether this event loop tick has moved
+        self._pending_movement = None
+        self._movement_tick = False
+        self._movement_rows = None
         w = self.listbox = urwid.ListBox(body)
 
         self.columns = urwid.Columns([
@@ -125,9 +146,119 @@ class ScrollingListBox(urwid.WidgetWrap):
         urwid.connect_signal(self.body, "modified", self.on_modified)
 
     def on_modified(self):
-        if self.with_scrollbar and len(self.body):
+        # rebuilt when rendered, so a burst of focus changes only costs one
+        if self.with_scrollbar:
+            self._scrollbar_dirty = True
+            self._invalidate()
+
+    def update_scrollbar(self):
+        self._scrollbar_dirty = False
+        if len(self.body):
             self.scroll_bar.update(self.size)
 
+    def coalesce_keypress(self, size, command):
+        # Holding a movement key sends a burst of identical keypresses.  The
+        # first one in an event loop tick moves as usual; the rest are only
+        # counted, and applied together as one jump when the tick ends (or
+        # before anything else looks at the focus).  Only done while an
+        # asyncio loop is running, so direct calls still move immediately.
+        if not (self.coalesce_movement
+                and self._movement_tick
+                and command in self.MOVEMENT_COMMANDS):
+            return False
+        try:
+            position = self.listbox.focus_position
+        except IndexError:
+            return False
+        if not isinstance(position, int):
+            return False
+
+        if self._pending_movement:
+            (pending_command, pending_size, start, count) = self._pending_movement
+            if pending_command != command or pending_size != size:
+                return False
+        else:
+            start, count = position, 0
+        target = start + self.movement_steps(size, command, count+1)
+        if target < 0 or target > len(self.body) - 1:
+            # the end is handled as usual, e.g. to load more
+            return False
+        # urwid moves by screen rows, which only match positions when every
+        # row moved over or brought into view is one line tall
+        if self._pending_movement:
+            (checked_start, checked_end) = self._movement_rows
+        else:
+            (checked_start, checked_end) = (start, start-1)
+        height = size[1]
+        rows_start = max(min(start, target) - height, 0)
+        rows_end = min(max(start, target) + height, len(self.body) - 1)
+        if not (self.single_line_rows(size, range(rows_start, checked_start))
+                and self.single_line_rows(size, range(checked_end+1, rows_end+1))
+                and self.single_line_rows(size, [target], focus=True)):
+            return False
+        self._movement_rows = (min(rows_start, checked_start),
+                               max(rows_end, checked_end))
+        self._pending_movement = (command, size, start, count+1)
+        self._invalidate()
+        return True
+
+    def single_line_rows(self, size, positions, focus=False):
+        width = size[0]
+        if self.with_scrollbar:
+            width -= 1
+        # the body can answer without building the widgets, e.g. for rows
+        # a page movement skips over
+        rows_at = getattr(self.body, "rows_at", None)
+        if rows_at is None:
+            rows_at = lambda position, size, focus: self.body[position].rows(
+                size, focus
+            )
+        return all(
+            rows_at(position, (width,), focus) == 1
+            for position in positions
+        )
+
+    def movement_steps(self, size, command, count):
+        step = size[1] if "page" in command else 1
+        return self.MOVEMENT_COMMANDS[command] * step * count
+
+    def start_movement_tick(self):
+        if not self.coalesce_movement or self._movement_tick:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._movement_tick = True
+        loop.call_soon(self.end_movement_tick)
+
+    def end_movement_tick(self):
+        self._movement_tick = False
+        self.apply_movement()
+
+    def apply_movement(self):
+
+        if not self._pending_movement:
+            return
+        (command, size, start, count) = self._pending_movement
+        self._pending_movement = None
+        if self.listbox.focus_position != start:
+            # something else moved the focus in the meantime
+            return
+        width, height = size
+        if self.with_scrollbar:
+            width -= 1
+        offset, inset = self.listbox.get_focus_offset_inset((width, height))
+        direction = self.MOVEMENT_COMMANDS[command]
+        if "page" not in command:
+            offset = min(max(offset + direction * count, 0), height - 1)
+        self.listbox.change_focus(
+            (width, height),
+            start + self.movement_steps(size, command, count),
+            offset_inset=offset,
+            coming_from="above" if direction > 0 else "below"
+        )
+
     def rows_max(self, size, focus=False):
         return urwid.ListBox.rows_max(self, size, focus)
 
@@ -144,6 +275,13 @@ class ScrollingListBox(urwid.WidgetWrap):
                 foreground_high = "black",
                 background_high = "white"
             ),
+            "scroll_pos_estimated": PaletteEntry(
+                mono = "white",
+                foreground = "black",
+                background = "light gray",
+                foreground_high = "black",
+                background_high = "g70"
+            ),
             "scroll_marker": PaletteEntry(
                 mono = "white,bold",
                 foreground = "black,bold",
@@ -171,6 +309,7 @@ class ScrollingListBox(urwid.WidgetWrap):
     def mouse_event(self, size, event, button, col, row, focus):
 
         SCROLL_WHEEL_HEIGHT_RATIO = 0.5
+        self.apply_movement()
         if row < 0 or row >= self._height or not len(self.listbox.body):
             return
         if event == 'mouse press':
@@ -224,8 +363,13 @@ class ScrollingListBox(urwid.WidgetWrap):
     def keypress(self, size, key):
 
         command = self._command_map[key]
+        if command and self.coalesce_keypress(size, command):
+            return None
+        self.apply_movement()
         if not command:
             return super(ScrollingListBox, self).keypress(size, key)
+        if command in self.MOVEMENT_COMMANDS:
+            self.start_movement_tick()
 
         # down, page down at end trigger load of more data
         if (
@@ -247,7 +391,8 @@ class ScrollingListBox(urwid.WidgetWrap):
 
     @property
     def selection(self):
-
+        """Widget with focus, after applying any coalesced movement."""
+        self.apply_movement()
         if len(self.body):
             return self.body[self.focus_position]
 
@@ -257,16 +402,19 @@ class ScrollingListBox(urwid.WidgetWrap):
 
     def render(self, size, focus=False):
 
+        self.apply_movement()
         maxcol = size[0]
         self._width = maxcol
         if len(size) > 1:
             maxrow = size[1]
-            modified = self._height == 0
+            modified = self._height != maxrow
             self._height = maxrow
             if modified:
                 self.on_modified()
         else:
             self._height = 0
+        if self._scrollbar_dirty:
+            self.update_scrollbar()
 
         # print
         # print
@@ -315,6 +463,13 @@ class ScrollingListBox(urwid.WidgetWrap):
 
     @property
     def focus_position(self):
+        """Position with focus.
+
+        Movement keys coalesced in this event loop tick are applied first,
+        so this reflects every key already received, and may move the focus
+        and emit the body's modified signal.
+        """
+        self.apply_movement()
         if not len(self.listbox.body):
             raise IndexError
         try:
@@ -325,6 +480,7 @@ class ScrollingListBox(urwid.WidgetWrap):
 
     @focus_position.setter
     def focus_position(self, value):
+        self._pending_movement = None
         if not len(self.body):
             return
         self.listbox.focus_position = value
@@ -343,4 +499,8 @@ class ScrollingListBox(urwid.WidgetWrap):
             return self.row_count_fn()
         return len(self.body)
 
+    @property
+    def row_count_estimated(self):
+        return getattr(self.body, "row_count_estimated", False)
+
 __all__ = ["ScrollingListBox"]
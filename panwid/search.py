@@ -0,0 +1,353 @@
+import bisect
+import heapq
+import itertools
+import operator
+from collections import defaultdict
+
+# upper bound for prefix range lookups in the sorted key list
+MAX_CHAR = "\U0010ffff"
+
+def trigrams(s):
+    return set(s[i:i+3] for i in range(len(s)-2))
+
+def unfold_offsets(s):
+    # position in s of each character of s.casefold(), which can be longer
+    # than s, e.g. "ß" folds to "ss"
+    return [ i for i, c in enumerate(s) for _ in c.casefold() ]
+
+def unfold_span(s, start, end):
+    # the span of s that a span of s.casefold() was folded from
+    if len(s.casefold()) == len(s):
+        return (start, end)
+    offsets = unfold_offsets(s)
+    return (offsets[start], offsets[end-1] + 1)
+
+
+class SearchIndex(object):
+    """
+    Case-insensitive text search index over a set of items.
+
+    Values are normalized to casefolded strings (via key_fn) and kept in a
+    sorted list, so prefix matches are a binary search.  Substring matches
+    use a trigram index that is only built the first time one is requested.
+    Both are updated in place by add(), update() and remove().
+    """
+
+    # smaller batches are cheaper to insert one at a time than to merge
+    MERGE_SIZE = 100
+
+    def __init__(self, items, key_fn=str):
+
+        self.key_fn = key_fn
+        self._keys = {}
+        for index, value in items:
+            self._keys[index] = self.key(value)
+        self.sorted_indexes = sorted(self._keys, key=self._keys.get)
+        self.sorted_keys = [self._keys[i] for i in self.sorted_indexes]
+        self._trigrams = None
+
+    def key(self, value):
+        return str(self.key_fn(value)).casefold()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __getitem__(self, index):
+        return self._keys[index]
+
+    def __contains__(self, index):
+        return index in self._keys
+
+    @property
+    def trigrams(self):
+        if self._trigrams is None:
+            self._trigrams = defaultdict(set)
+            for index, key in self._keys.items():
+                for t in trigrams(key):
+                    self._trigrams[t].add(index)
+        return self._trigrams
+
+    def add(self, index, value):
+
+        if index in self._keys:
+            self.remove(index)
+        key = self._keys[index] = self.key(value)
+        pos = bisect.bisect_right(self.sorted_keys, key)
+        self.sorted_keys.insert(pos, key)
+        self.sorted_indexes.insert(pos, index)
+        if self._trigrams is not None:
+            for t in trigrams(key):
+                self._trigrams[t].add(index)
+
+    def update(self, items):
+
+        # the new keys are sorted and merged into the sorted list in one
+        # pass, rather than inserted one at a time
+        items = list(items)
+        if len(items) < self.MERGE_SIZE:
+            for index, value in items:
+                self.add(index, value)
+            return
+        keys = {}
+        for index, value in items:
+            if index in self._keys:
+                self.remove(index)
+            keys[index] = self.key(value)
+        sorted_keys = []
+        sorted_indexes = []
+        start = 0
+        for index, key in sorted(keys.items(), key=operator.itemgetter(1)):
+            end = bisect.bisect_right(self.sorted_keys, key, start)
+            sorted_keys += self.sorted_keys[start:end]
+            sorted_indexes += self.sorted_indexes[start:end]
+            sorted_keys.append(key)
+            sorted_indexes.append(index)
+            start = end
+        sorted_keys += self.sorted_keys[start:]
+        sorted_indexes += self.sorted_indexes[start:]
+        self.sorted_keys = sorted_keys
+        self.sorted_indexes = sorted_indexes
+        self._keys.update(keys)
+        if self._trigrams is not None:
+            for index, key in keys.items():
+                for t in trigrams(key):
+                    self._trigrams[t].add(index)
+
+    def remove(self, index):
+
+        key = self._keys.pop(index, None)
+        if key is None:
+            return
+        lo = bisect.bisect_left(self.sorted_keys, key)
+        hi = bisect.bisect_right(self.sorted_keys, key)
+        pos = lo + self.sorted_indexes[lo:hi].index(index)
+        del self.sorted_keys[pos]
+        del self.sorted_indexes[pos]
+        if self._trigrams is not None:
+            for t in trigrams(key):
+                self._trigrams[t].discard(index)
+
+    def prefix(self, text):
+        text = text.casefold()
+        lo = bisect.bisect_left(self.sorted_keys, text)
+        hi = bisect.bisect_left(self.sorted_keys, text + MAX_CHAR, lo)
+        return self.sorted_indexes[lo:hi]
+
+    def substring(self, text):
+
+        text = text.casefold()
+        if len(text) < 3:
+            # too short for trigrams
+            return [ i for i, k in self._keys.items() if text in k ]
+        sets = sorted(
+            (self.trigrams.get(t, set()) for t in trigrams(text)),
+            key=len
+        )
+        candidates = sets[0].intersection(*sets[1:])
+        return [ i for i in candidates if text in self._keys[i] ]
+
+    def find(self, text, anywhere=False):
+        if anywhere:
+            return self.substring(text)
+        return self.prefix(text)
+
+
+# characters after which a match counts as the start of a word
+WORD_BOUNDARY = set(" \t-_/\\.:,;()[]{}'\"")
+
+FUZZY_SCORE_MATCH = 16
+FUZZY_BONUS_BOUNDARY = 8
+FUZZY_BONUS_CONSECUTIVE = 8
+FUZZY_PENALTY_GAP_START = 3
+FUZZY_PENALTY_GAP_EXTENSION = 1
+
+def fuzzy_score(key, positions):
+    """
+    fzf-style score of a subsequence match: points for each matched
+    character, bonuses for matches at word boundaries (doubled for the
+    first character) and for consecutive matches, and penalties for gaps.
+    """
+    score = 0
+    prev = None
+    for p in positions:
+        score += FUZZY_SCORE_MATCH
+        if p == 0 or key[p-1] in WORD_BOUNDARY:
+            score += FUZZY_BONUS_BOUNDARY * (2 if prev is None else 1)
+        if prev is not None:
+            if p == prev + 1:
+                score += FUZZY_BONUS_CONSECUTIVE
+            else:
+                score -= (FUZZY_PENALTY_GAP_START
+                          + FUZZY_PENALTY_GAP_EXTENSION * (p - prev - 2))
+        prev = p
+    return score
+
+def fuzzy_match(key, text):
+    """
+    Best-scoring alignment of text as a subsequence of key, as a
+    (score, positions) tuple, or None if it doesn't match.  Scores are the
+    same as fuzzy_score() gives, but every alignment is considered, so e.g.
+    "sqn" matches the word starts of "sit quisquam numquam" rather than the
+    first "sq" it comes across.
+    """
+    # (score, position, path) of the best alignment of text[:j+1] ending at
+    # each occurrence of text[j]
+    prev = None
+    for c in text:
+        occurrences = []
+        i = key.find(c)
+        while i >= 0:
+            occurrences.append(i)
+            i = key.find(c, i+1)
+        if prev is None:
+            current = [
+                (FUZZY_SCORE_MATCH
+                 + (2*FUZZY_BONUS_BOUNDARY if i == 0 or key[i-1] in WORD_BOUNDARY else 0),
+                 i, (i,))
+                for i in occurrences
+            ]
+        else:
+            # a gap before i costs START + EXTENSION * (i - q - 2), so the
+            # best predecessor across a gap is the one with the highest
+            # score + q * EXTENSION among those at least two back
+            at = { m[1]: m for m in prev }
+            current = []
+            k = 0
+            gapped = None
+            for i in occurrences:
+                while k < len(prev) and prev[k][1] <= i - 2:
+                    m = prev[k]
+                    if gapped is None or (
+                            m[0] + m[1] * FUZZY_PENALTY_GAP_EXTENSION
+                            > gapped[0] + gapped[1] * FUZZY_PENALTY_GAP_EXTENSION):
+                        gapped = m
+                    k += 1
+                candidates = []
+                if gapped is not None:
+                    candidates.append((
+                        gapped[0] - FUZZY_PENALTY_GAP_START
+                        - FUZZY_PENALTY_GAP_EXTENSION * (i - gapped[1] - 2),
+                        gapped[2]
+                    ))
+                m = at.get(i-1)
+                if m is not None:
+                    candidates.append((m[0] + FUZZY_BONUS_CONSECUTIVE, m[2]))
+                if not candidates:
+                    continue
+                score, path = max(candidates, key=operator.itemgetter(0))
+                if key[i-1] in WORD_BOUNDARY:
+                    score += FUZZY_BONUS_BOUNDARY
+                current.append((score + FUZZY_SCORE_MATCH, i, path + (i,)))
+        if not current:
+            return None
+        prev = current
+    score, _, positions = max(prev, key=lambda m: (m[0], -m[1]))
+    return (score, list(positions))
+
+
+class FuzzyIndex(object):
+    """
+    Fuzzy (subsequence) matcher over a list of labels.
+
+    Matching is done for all labels at once: the leftmost match of a query
+    ends exactly one str.find() past the leftmost match of the query minus
+    its last character, so each query is computed from the cached result
+    for its prefix with a single map() over the surviving candidates.
+    Typing one more character only rechecks the previous matches.
+
+    search() ranks the matches by how compact they are, then rescores the
+    best SCORE_LIMIT of those with fuzzy_match; the rest follow in label
+    order.  That keeps the cost per keystroke bounded when a short query
+    matches most of the labels.
+    """
+
+    CACHE_SIZE = 100
+    SCORE_LIMIT = 100
+
+    def __init__(self, labels):
+        labels = [ str(l) for l in labels ]
+        self.keys = [ l.casefold() for l in labels ]
+        # labels that casefolding changed the length of, to map match
+        # positions back to
+        self._unfolded = {
+            pos: labels[pos] for pos in itertools.compress(
+                itertools.count(),
+                map(operator.ne, map(len, labels), map(len, self.keys))
+            )
+        }
+        self._matches = {}
+        self._ranked = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def matches(self, text):
+        # (positions, starts, ends) of the leftmost match of text in each
+        # label that contains it as a subsequence
+        try:
+            return self._matches[text]
+        except KeyError:
+            pass
+
+        if len(text) == 1:
+            positions = range(len(self.keys))
+            starts = ends = list(map(str.find, self.keys, itertools.repeat(text)))
+        else:
+            positions, starts, ends = self.matches(text[:-1])
+            ends = list(map(
+                str.find,
+                map(self.keys.__getitem__, positions),
+                itertools.repeat(text[-1]),
+                map(operator.add, ends, itertools.repeat(1))
+            ))
+        found = list(map(operator.ne, ends, itertools.repeat(-1)))
+        result = self._matches[text] = (
+            list(itertools.compress(positions, found)),
+            list(itertools.compress(starts, found)),
+            list(itertools.compress(ends, found))
+        )
+        return result
+
+    def search(self, text):
+
+        text = text.casefold()
+        if not text:
+            return list(range(len(self)))
+        try:
+            return self._ranked[text]
+        except KeyError:
+            pass
+
+        if len(self._ranked) >= self.CACHE_SIZE:
+            self.clear()
+
+        positions, starts, ends = self.matches(text)
+        keys = self.keys
+        best = sorted(
+            (-fuzzy_match(keys[pos], text)[0], len(keys[pos]), pos)
+            for span, start, pos in heapq.nsmallest(
+                    self.SCORE_LIMIT,
+                    zip(map(operator.sub, ends, starts), starts, positions)
+            )
+        )
+        best = [ pos for (_, _, pos) in best ]
+        result = best + list(itertools.filterfalse(set(best).__contains__, positions))
+        self._ranked[text] = result
+        return result
+
+    def positions(self, pos, text):
+        # matched character positions in a label, for highlighting
+        match = fuzzy_match(self.keys[pos], text.casefold())
+        if not match:
+            return None
+        label = self._unfolded.get(pos)
+        if label is None:
+            return match[1]
+        offsets = unfold_offsets(label)
+        return sorted(set(offsets[p] for p in match[1]))
+
+    def clear(self):
+        self._matches.clear()
+        self._ranked.clear()
+
+__all__ = ["SearchIndex", "FuzzyIndex"]
@@ -8,6 +8,7 @@ This module contains a set of urwid text-like widgets for creating tiny but
 hopefully useful sparkline-like visualizations of data.
 """
 
+import sys
 import urwid
 from urwid_utils.palette import *
 from collections import deque
@@ -387,7 +388,8 @@ def bar_widths(party_votes, total_seats):
     return list(ret.values())
 
 
-@dataclass
+# slots keep bar items small; dataclass only supports them from 3.10 on
+@dataclass(**({"slots": True} if sys.version_info >= (3, 10) else {}))
 class SparkBarItem:
 
     value: int
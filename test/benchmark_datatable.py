@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# Benchmarks for DataTable hot paths.
+#
+# Runs headless: widgets are rendered straight to canvases, no screen needed.
+#
+#   python -m test.benchmark_datatable --rows 10000,100000 -o bench.json
+#   python -m test.benchmark_datatable --rows 10000 --compare bench.json
+
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+from panwid.datatable import *
+
+try:
+    import pydantic
+    HAVE_PYDANTIC=True
+except ImportError:
+    HAVE_PYDANTIC=False
+
+SIZE = (120, 40)
+
+COLUMNS = [
+    ("uniqueid", dict(hide=True)),
+    ("foo", dict(align="right", width=6)),
+    ("bar", dict(align="right", width=10)),
+    ("baz", dict(width=("weight", 1))),
+    ("qux", dict(pack=True)),
+]
+
+@dataclasses.dataclass
+class Record:
+    uniqueid: int
+    foo: int
+    bar: float
+    baz: str
+    qux: str
+
+if HAVE_PYDANTIC:
+    class RecordModel(pydantic.BaseModel):
+        uniqueid: int
+        foo: int
+        bar: float
+        baz: str
+        qux: str
+
+def make_columns():
+    return [DataTableColumn(name, **kwargs) for name, kwargs in COLUMNS]
+
+def make_rows(n, record="dict", seed=0):
+    r = random.Random(seed)
+    rows = [
+        dict(
+            uniqueid=i,
+            foo=r.randint(0, 1000),
+            bar=r.uniform(0, 1000),
+            baz="".join(r.choice(string.ascii_letters + " ") for _ in range(r.randint(5, 30))),
+            qux=r.choice(["new", "open", "closed", "resolved"])
+        )
+        for i in range(n)
+    ]
+    if record == "dataclass":
+        rows = [Record(**row) for row in rows]
+    elif record == "pydantic":
+        rows = [RecordModel(**row) for row in rows]
+    return rows
+
+def make_table(rows, **kwargs):
+    return DataTable(make_columns(), data=rows, index="uniqueid", **kwargs)
+
+def loaded_table(rows, **kwargs):
+    table = make_table(rows, **kwargs)
+    table.render(SIZE, focus=True)
+    return table
+
+
+def bench_requery(rows):
+    table = make_table(rows)
+    yield
+    table.render(SIZE, focus=True)
+
+def bench_sort_by_column(rows):
+    table = loaded_table(rows)
+    yield
+    table.sort_by_column("bar", reverse=True)
+    table.render(SIZE, focus=True)
+
+def bench_apply_filters(rows):
+    table = loaded_table(rows)
+    yield
+    table.apply_filters(lambda row: row["foo"] > 500)
+    table.render(SIZE, focus=True)
+
+def bench_add_row(rows, count=1000):
+    table = loaded_table(rows)
+    new = make_rows(len(rows) + count, seed=1)[len(rows):]
+    yield
+    for row in new:
+        table.add_row(row, sort=False)
+    table.render(SIZE, focus=True)
+
+def bench_scroll(rows, pages=50):
+    table = loaded_table(rows)
+    yield
+    for i in range(pages):
+        table.keypress(SIZE, "page down")
+        table.render(SIZE, focus=True)
+
+def bench_pack_columns(rows):
+    table = loaded_table(rows)
+    yield
+    table.pack_columns()
+    table.render(SIZE, focus=True)
+
+def bench_resize_column(rows, steps=20):
+    table = loaded_table(rows)
+    yield
+    for i in range(steps):
+        table.resize_column("bar", 10 + i % 5)
+        table.render(SIZE, focus=True)
+
+def bench_save_load_json(rows):
+    table = loaded_table(rows)
+    d = tempfile.mkdtemp()
+    path = os.path.join(d, "table.json")
+    yield
+    table.save(path)
+    make_table([]).load(path)
+    shutil.rmtree(d)
+
+def bench_save_load_columnar(rows):
+    table = loaded_table(rows)
+    d = tempfile.mkdtemp()
+    path = os.path.join(d, "table")
+    yield
+    table.save(path, format="columnar")
+    t = make_table([], limit=100)
+    t.load(path)
+    t.render(SIZE, focus=True)
+    t.snapshot.close()
+    shutil.rmtree(d)
+
+BENCHMARKS = {
+    "requery": bench_requery,
+    "sort_by_column": bench_sort_by_column,
+    "apply_filters": bench_apply_filters,
+    "add_row": bench_add_row,
+    "scroll": bench_scroll,
+    "pack_columns": bench_pack_columns,
+    "resize_column": bench_resize_column,
+    "save_load_json": bench_save_load_json,
+    "save_load_columnar": bench_save_load_columnar,
+}
+
+# only requery depends on the record type; everything after it works on
+# the dataframe, so the other benchmarks just use dicts
+RECORD_BENCHMARKS = ["requery"]
+
+
+def run(fn, rows, repeat):
+    times = []
+    for i in range(repeat):
+        bench = fn(rows)
+        next(bench)
+        start = time.perf_counter()
+        for _ in bench:
+            pass
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, path):
+    with open(path) as f:
+        baseline = {
+            (r["name"], r["record"], r["rows"]): r["seconds"]
+            for r in json.load(f)["results"]
+        }
+    for r in results:
+        old = baseline.get((r["name"], r["record"], r["rows"]))
+        if old:
+            print("%-20s %-10s %8d %10.4f %10.4f %7.2fx" %(
+                r["name"], r["record"], r["rows"], old, r["seconds"], old/r["seconds"]
+            ))
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--rows", default="10000",
+                        help="comma-separated table sizes, e.g. 10000,100000,1000000")
+    parser.add_argument("-b", "--benchmark", action="append",
+                        choices=list(BENCHMARKS.keys()))
+    parser.add_argument("--records", default="dict,dataclass,pydantic",
+                        help="comma-separated record types for requery")
+    parser.add_argument("-n", "--repeat", type=int, default=1)
+    parser.add_argument("-o", "--output", help="write results to JSON file")
+    parser.add_argument("-c", "--compare", help="compare against a previous JSON file")
+    options = parser.parse_args()
+
+    records = [
+        r for r in options.records.split(",")
+        if r != "pydantic" or HAVE_PYDANTIC
+    ]
+    results = []
+    for size in [int(n) for n in options.rows.split(",")]:
+        for name in options.benchmark or BENCHMARKS.keys():
+            for record in (records if name in RECORD_BENCHMARKS else ["dict"]):
+                rows = make_rows(size, record)
+                seconds = run(BENCHMARKS[name], rows, options.repeat)
+                results.append(dict(name=name, record=record, rows=size, seconds=seconds))
+                print("%-20s %-10s %8d %10.4f" %(name, record, size, seconds))
+                sys.stdout.flush()
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(dict(
+                commit=git_commit(),
+                python=platform.python_version(),
+                time=time.time(),
+                results=results
+            ), f, indent=2)
+
+    if options.compare:
+        compare(results, options.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# Memory benchmark: bytes allocated per DataTable row widget, per
+# DataTableColumn, per SparkBarItem, per DropdownItem, and per item of a
+# whole Dropdown.
+#
+#   python -m test.benchmark_memory --rows 2000
+#   python -m test.benchmark_memory --rows 2000 -o mem.json -c old.json
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+from panwid.datatable import *
+from panwid.dropdown import Dropdown, DropdownItem
+from panwid.sparkwidgets import SparkBarItem
+
+from .benchmark_datatable import make_rows, make_table, SIZE, git_commit
+
+
+def measure(setup, build):
+    state = setup()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build(state)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+def mem_table_rows(n):
+    def setup():
+        table = make_table(make_rows(n))
+        table.render(SIZE, focus=True)
+        return table
+    def build(table):
+        return [table[i] for i in range(len(table))]
+    return measure(setup, build) / n
+
+def mem_table_columns(n):
+    return measure(
+        lambda: None,
+        lambda state: [DataTableColumn("column%d" %(i)) for i in range(n)]
+    ) / n
+
+def mem_sparkbar_items(n):
+    return measure(
+        lambda: None,
+        lambda state: [SparkBarItem(i, label="item %d" %(i)) for i in range(n)]
+    ) / n
+
+def mem_dropdown_items(n):
+    labels = ["item %d" %(i) for i in range(n)]
+    return measure(
+        lambda: labels,
+        lambda labels: [DropdownItem(l, i) for i, l in enumerate(labels)]
+    ) / n
+
+def mem_dropdown(n):
+    labels = ["item %d" %(i) for i in range(n)]
+    return measure(
+        lambda: labels,
+        lambda labels: Dropdown(labels)
+    ) / n
+
+BENCHMARKS = {
+    "table_row": mem_table_rows,
+    "table_column": mem_table_columns,
+    "sparkbar_item": mem_sparkbar_items,
+    "dropdown_item": mem_dropdown_items,
+    "dropdown": mem_dropdown,
+}
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--rows", type=int, default=2000)
+    parser.add_argument("-o", "--output", help="write results to JSON file")
+    parser.add_argument("-c", "--compare", help="compare against a previous JSON file")
+    options = parser.parse_args()
+
+    results = {}
+    for name, fn in BENCHMARKS.items():
+        results[name] = fn(options.rows)
+        print("%-20s %10.1f bytes/item" %(name, results[name]))
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(dict(commit=git_commit(), rows=options.rows, results=results), f, indent=2)
+
+    if options.compare:
+        with open(options.compare) as f:
+            old = json.load(f)["results"]
+        for name, value in results.items():
+            if name in old:
+                print("%-20s %10.1f %10.1f %+6.1f%%" %(
+                    name, old[name], value, (value-old[name])/old[name]*100
+                ))
+
+if __name__ == "__main__":
+    main()
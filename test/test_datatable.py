@@ -1,6 +1,12 @@
 import unittest
+import os
+import tempfile
+import asyncio
+
+import urwid
 
 from panwid.datatable import *
+from panwid.search import SearchIndex
 from orderedattrdict import AttrDict
 
 class TestDataTableWithIndex(unittest.TestCase):
@@ -43,3 +49,572 @@ class TestDataTableWithIndex(unittest.TestCase):
         dt.refresh()
         dt.add_row(dict(a=4, b=7.142, c="qux"))
         self.assertEqual(len(dt), 4)
+
+    def test_save_load_json(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a")
+        dt.refresh()
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "table.json")
+            dt.save(path)
+            dt2 = DataTable(self.columns, index="a")
+            dt2.load(path)
+        self.assertEqual(len(dt2), 3)
+        self.assertEqual(dt2[1]["c"], "bar")
+
+    def test_save_load_columnar(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a")
+        dt.refresh()
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "table")
+            dt.save(path, format="columnar")
+            dt2 = DataTable(self.columns, index="a")
+            dt2.load(path)
+            self.assertEqual(len(dt2), 3)
+            self.assertEqual(dt2[2]["b"], -3.19)
+            dt2.snapshot.close()
+
+    def test_load_json_keeps_query(self):
+
+        data = self.data
+
+        class QueryDataTable(DataTable):
+
+            def query(self, sort=None, offset=None, limit=None, **kwargs):
+                return data[1:]
+
+        dt = DataTable(self.columns, data=self.data, index="a")
+        dt.refresh()
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "table.json")
+            dt.save(path)
+            dt2 = QueryDataTable(self.columns, index="a")
+            dt2.load(path)
+        self.assertEqual(len(dt2), 3)
+        # refreshing queries the data source again
+        dt2.refresh()
+        self.assertEqual(len(dt2), 2)
+
+    def test_columnar_query_sort(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a")
+        dt.refresh()
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "table")
+            dt.save(path, format="columnar")
+            dt2 = DataTable(self.columns, index="a", query_sort=True)
+            with self.assertRaises(Exception):
+                dt2.load(path)
+            self.assertIsNone(dt2.snapshot)
+
+    def test_columnar_filter_refresh(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a")
+        dt.refresh()
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "table")
+            dt.save(path, format="columnar")
+            dt2 = DataTable(self.columns, index="a")
+            dt2.load(path)
+            dt2.apply_filters(lambda row: row["a"] > 2)
+            self.assertEqual(len(dt2), 1)
+            dt2.refresh()
+            self.assertEqual(len(dt2.df), 3)
+            dt2.clear_filters()
+            self.assertEqual(len(dt2), 3)
+            dt2.snapshot.close()
+
+    def test_export_import_jsonl(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a")
+        dt.refresh()
+        dt.apply_filters(lambda row: row["a"] > 1)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "table.jsonl")
+            dt.export(path)
+            dt2 = DataTable(self.columns, data=[], index="a")
+            dt2.refresh()
+            counts = list(dt2.import_rows(path, batch_size=1))
+        self.assertEqual(counts, [1, 2])
+        self.assertEqual(dt2[0]["c"], "bar")
+
+    def test_import_rows_filtered(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a")
+        dt.refresh()
+        dt.apply_filters(lambda row: row["b"] > 0)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "table.jsonl")
+            with open(path, "w") as f:
+                f.write('{"b": 1.0, "c": "qux"}\n{"b": -1.0, "c": "quux"}\n')
+            list(dt.import_rows(path, batch_size=1))
+        # new rows are numbered after the existing ones, and filtered
+        self.assertEqual(sorted(dt.df.index), [1, 2, 3, 4, 5])
+        self.assertEqual(sorted(r["c"] for r in dt), ["bar", "foo", "qux"])
+
+    def test_import_rows_csv(self):
+
+        columns = [
+            DataTableColumn("a"),
+            DataTableColumn("b", type=float),
+            DataTableColumn("c")
+        ]
+        dt = DataTable(columns, data=self.data, index="a")
+        dt.refresh()
+        self.assertEqual(dt.row_count(), 3)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "table.csv")
+            with open(path, "w") as f:
+                f.write("a,b,c\n7,1.5,qux\n,,quux\n")
+            list(dt.import_rows(path))
+        self.assertEqual(sorted(dt.df.index), [1, 2, 3, 7, 8])
+        self.assertEqual(dt.df.get_cell(7, "b"), 1.5)
+        self.assertIsNone(dt.df.get_cell(8, "b"))
+        self.assertEqual(dt.row_count(), 5)
+
+    def test_sort_order(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a")
+        dt.refresh()
+        dt.sort_by_column("b", reverse=True)
+        self.assertEqual([r["c"] for r in dt], ["bar", "foo", "baz"])
+
+    def test_filter_spec(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a")
+        dt.refresh()
+        dt.apply_filters(("b", ">", 0))
+        self.assertEqual(len(dt), 2)
+
+    def test_query_filter(self):
+
+        data = self.data
+        calls = []
+
+        class QueryDataTable(DataTable):
+
+            def query(self, sort=None, offset=None, limit=None, filters=None, **kwargs):
+                calls.append(filters)
+                rows = [ d for d in data if not filters or all(f(d) for f in filters) ]
+                return rows[offset:offset+limit]
+
+            def query_result_count(self, filters=None):
+                return len([ d for d in data if not filters or all(f(d) for f in filters) ])
+
+        dt = QueryDataTable(self.columns, index="a", limit=2, query_filter=True)
+        dt.reset()
+        self.assertEqual(dt.row_count(), 3)
+        dt.apply_filters(DataTableFilter("c", "startswith", "ba"))
+        self.assertEqual(calls[-1], [DataTableFilter("c", "startswith", "ba")])
+        self.assertEqual(len(dt), 2)
+        self.assertEqual(dt.row_count(), 2)
+
+    def test_query_cursor(self):
+
+        data = self.data + [dict(a=4, b=1.5, c="foo")]
+        cursors = []
+
+        class QueryDataTable(DataTable):
+
+            def query(self, sort=None, offset=None, limit=None,
+                      cursor=None, cursor_index=None, load_all=False):
+                cursors.append((cursor, cursor_index))
+                rows = sorted(data, key=lambda d: (d["c"], d["a"]))
+                if cursor is not None:
+                    rows = [ d for d in rows if (d["c"], d["a"]) > (cursor, cursor_index) ]
+                return rows[:limit]
+
+            def query_result_count(self):
+                return len(data)
+
+        dt = QueryDataTable(self.columns, index="a", limit=2,
+                            sort_by="c", query_sort=True)
+        dt.reset()
+        dt.load_more(None)
+        self.assertEqual(cursors, [(None, None), ("baz", 3)])
+        self.assertEqual([d["a"] for d in dt], [2, 3, 1, 4])
+
+        # query methods that don't take cursor_index still work
+        class OldQueryDataTable(QueryDataTable):
+
+            def query(self, sort=None, offset=None, limit=None,
+                      cursor=None, load_all=False):
+                rows = sorted(data, key=lambda d: d["c"])
+                return [ d for d in rows if cursor is None or d["c"] > cursor ][:limit]
+
+        dt = OldQueryDataTable(self.columns, index="a", limit=2,
+                               sort_by="c", query_sort=True)
+        dt.reset()
+        dt.load_more(None)
+        self.assertEqual(len(dt.df), 4)
+
+    def test_row_count_cached(self):
+
+        data = self.data
+        calls = []
+
+        class QueryDataTable(DataTable):
+
+            def query(self, sort=None, offset=None, limit=None, **kwargs):
+                return data[offset:offset+limit]
+
+            def query_result_count(self):
+                calls.append(True)
+                return len(data)
+
+        dt = QueryDataTable(self.columns, index="a", limit=2)
+        dt.reset()
+        calls.clear()
+        for i in range(3):
+            self.assertEqual(dt.row_count(), 3)
+        self.assertEqual(len(calls), 0)
+        dt.invalidate_row_count()
+        dt.row_count()
+        dt.row_count()
+        self.assertEqual(len(calls), 1)
+
+    def test_row_count_async(self):
+
+        data = self.data
+
+        class QueryDataTable(DataTable):
+
+            def query(self, sort=None, offset=None, limit=None, **kwargs):
+                return data[offset:offset+limit]
+
+            async def query_result_count(self):
+                calls.append(True)
+                await asyncio.sleep(0.01)
+                return len(data)
+
+        calls = []
+        async def run():
+            dt = QueryDataTable(self.columns, index="a", limit=2)
+            dt.reset()
+            self.assertEqual(dt.row_count(), 2)
+            self.assertTrue(dt.row_count_estimated)
+            await asyncio.sleep(0.02)
+            self.assertEqual(dt.row_count(), 3)
+            self.assertFalse(dt.row_count_estimated)
+
+            # a cancelled count doesn't forget the one that replaced it
+            dt.add_row(dict(a=4, b=1.0, c="qux"))
+            dt.row_count()
+            await asyncio.sleep(0)
+            dt.invalidate_row_count()
+            dt.row_count()
+            await asyncio.sleep(0)
+            dt.row_count()
+            await asyncio.sleep(0.02)
+            self.assertEqual(len(calls), 3)
+            self.assertEqual(dt.row_count(), 3)
+
+        asyncio.run(run())
+
+    def test_row_count_async_error(self):
+
+        data = self.data
+
+        class QueryDataTable(DataTable):
+
+            def query(self, sort=None, offset=None, limit=None, **kwargs):
+                return data[offset:offset+limit]
+
+            async def query_result_count(self):
+                calls.append(True)
+                raise Exception("unavailable")
+
+        calls = []
+        async def run():
+            dt = QueryDataTable(self.columns, index="a", limit=2)
+            dt.reset()
+            with self.assertLogs("panwid.datatable", "ERROR"):
+                dt.row_count()
+                await asyncio.sleep(0)
+            self.assertFalse(dt.row_count_estimated)
+            self.assertIsNone(dt._row_count_task)
+            # the rows loaded so far stand in, without asking again
+            self.assertEqual(dt.row_count(), 2)
+            self.assertEqual(len(calls), 1)
+
+        asyncio.run(run())
+
+    def test_stats(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a", with_stats=True)
+        view = DataTableStatsView(dt)
+        dt.render((80, 10))
+        self.assertEqual(dt.stats.counters["rows_built"], 3)
+        self.assertIn("query", dt.stats.timers)
+        self.assertIn("transpose_data", dt.stats.timers)
+        self.assertIn("render", view.text.get_text()[0])
+
+    def test_row_access(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a")
+        dt.refresh()
+        row = dt[1]
+        self.assertEqual(row["c"], "bar")
+        self.assertEqual(row.c, "bar")
+        self.assertEqual(row.view["b"], 4.817)
+        self.assertEqual(row.view.a, 2)
+        with self.assertRaises(KeyError):
+            row["nope"]
+
+    def test_format_cache(self):
+
+        calls = []
+        def format_fn(v):
+            calls.append(v)
+            return "x%s" %(v)
+
+        column = DataTableColumn("a", format_fn=format_fn)
+        self.assertEqual(column.format_value(1), "x1")
+        self.assertEqual(column.format_value(1), "x1")
+        self.assertEqual(column.format_value(1.0), "x1.0")
+        self.assertEqual(column.format_value(1, 1), "x")
+        self.assertEqual(calls, [1, 1.0, 1])
+        column.format_value([1])
+        column.format_value([1])
+        self.assertEqual(len(calls), 5)
+
+    def test_toggle_columns(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a", with_stats=True)
+        dt.refresh()
+        row = dt[0]
+        self.assertEqual(len(row.data_cells), 3)
+        dt.hide_columns("b")
+        self.assertTrue(dt.column_named("b").hide)
+        dt.reset_stats()
+        self.assertEqual(len(dt[0].data_cells), 2)
+        self.assertIs(dt[0], row)
+        self.assertEqual(dt.stats.counters["rows_relaid_out"], 1)
+        self.assertEqual(dt.stats.counters.get("rows_built", 0), 0)
+        dt.show_columns("b")
+        self.assertEqual(len(dt[0].data_cells), 3)
+
+    def test_requery_leaves_rows_unbuilt(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a", with_stats=True)
+        dt.refresh()
+        row = dt[0]
+        dt.reset_stats()
+        dt.requery()
+        self.assertEqual(dt.stats.counters.get("rows_built", 0), 0)
+        self.assertIs(dt[0], row)
+        self.assertEqual(dt.stats.counters["rows_relaid_out"], 1)
+
+    def test_resize_column(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a", with_stats=True)
+        dt.refresh()
+        row = dt[0]
+        dt.resize_column("b", 12)
+        dt.reset_stats()
+        self.assertIs(dt[0], row)
+        self.assertEqual(dt.stats.counters["rows_resized"], 1)
+        self.assertEqual(row.columns.contents[2][1][:2], ("given", 12 + dt.column_named("b").padding*2))
+
+    def test_shared_attr_maps(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a",
+                       row_attr_fn=lambda p, d, r: "red" if p == 2 else None)
+        dt.refresh()
+        r0, r1, r2 = dt[0], dt[1], dt[2]
+        self.assertIs(r0.attrmap._attr_map, r1.attrmap._attr_map)
+        self.assertIs(r0.data_cells[0].normal_focus_map, r1.data_cells[0].normal_focus_map)
+        self.assertEqual(r2.attrmap._attr_map[r2.ATTR], "red")
+        self.assertNotIn(r2.ATTR, r0.attrmap._attr_map)
+
+    def test_detail_cache(self):
+
+        calls = []
+        def detail_fn(data):
+            calls.append(data.a)
+            return urwid.Text(data.c)
+
+        dt = DataTable(self.columns, data=self.data, index="a",
+                       detail_fn=detail_fn, detail_cache_size=1)
+        dt.refresh()
+        dt[0].open_details()
+        dt[0].close_details()
+        dt.invalidate_rows([dt.position_to_index(1)])
+        dt[0]._details = None
+        dt[0].open_details()
+        self.assertEqual(calls, [1])
+        dt[1].open_details()
+        dt[0]._details = None
+        dt[0].open_details()
+        self.assertEqual(calls, [1, 2, 1])
+
+    def test_detail_async(self):
+
+        async def detail_fn(data):
+            await asyncio.sleep(0)
+            return urwid.Text("details for %s" %(data.c))
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            dt = DataTable(self.columns, data=self.data, index="a",
+                           detail_fn=detail_fn)
+            dt.refresh()
+            row = dt[0]
+            row.open_details()
+            self.assertEqual(row.details.contents.text, dt.detail_placeholder)
+            loop.run_until_complete(asyncio.sleep(0.01))
+            self.assertEqual(row.details.contents.text, "details for foo")
+        finally:
+            loop.close()
+            asyncio.set_event_loop(None)
+
+    def test_detail_async_error(self):
+
+        calls = []
+        async def detail_fn(data):
+            calls.append(data.a)
+            if len(calls) == 1:
+                raise Exception("no details")
+            return urwid.Text("details for %s" %(data.c))
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            dt = DataTable(self.columns, data=self.data, index="a",
+                           detail_fn=detail_fn)
+            dt.refresh()
+            row = dt[0]
+            row.open_details()
+            with self.assertLogs("panwid", "ERROR"):
+                loop.run_until_complete(asyncio.sleep(0.01))
+            self.assertEqual(row.pile.contents[1][0].contents.text, dt.detail_error)
+            # reopening the details tries again
+            row.close_details()
+            row.open_details()
+            loop.run_until_complete(asyncio.sleep(0.01))
+            self.assertEqual(row.details.contents.text, "details for foo")
+            self.assertEqual(calls, [1, 1])
+        finally:
+            loop.close()
+            asyncio.set_event_loop(None)
+
+    def test_search(self):
+
+        dt = DataTable(self.columns, data=self.data, index="a", sort_by="c")
+        dt.reset(reset_sort=True)
+        # sorted by c: bar, baz, foo
+        self.assertEqual(dt.search("f"), 2)
+        self.assertEqual(dt.focus_position, 2)
+        self.assertEqual(dt.search("ba"), 0)
+        self.assertEqual(dt.search("ba", step=1), 1)
+        self.assertEqual(dt.search("ba", step=1), 0)
+        self.assertEqual(dt.search("az", anywhere=True), 1)
+        self.assertEqual(dt.search("4.8", column="b"), 0)
+        self.assertIsNone(dt.search("nope"))
+
+        dt.add_row(dict(a=4, b=1.0, c="bazooka"))
+        self.assertEqual(dt[dt.search("bazo")]["a"], 4)
+        dt.delete_rows(4)
+        self.assertIsNone(dt.search("bazo"))
+        dt[0]["c"] = "quux"
+        self.assertEqual(dt.search("quu"), 0)
+        # setting a cell's value goes through the row
+        dt[1].data_cells[2].value = "corge"
+        self.assertEqual(dt.search("corg"), 1)
+
+    def test_group_by(self):
+
+        data = self.data + [dict(a=4, b=1.5, c="foo")]
+        dt = DataTable(self.columns, data=data, index="a", sort_by="c",
+                       group_by="c", group_aggregates=dict(b="sum"))
+        dt.reset(reset_sort=True)
+        self.assertEqual([g.key for g in dt.groups.values()],
+                         [("bar",), ("baz",), ("foo",)])
+        # only group headers until a group is expanded
+        self.assertEqual(len(dt), 3)
+        foo = dt.groups[("foo",)]
+        self.assertEqual(sorted(foo.members), [1, 4])
+        self.assertAlmostEqual(dt[2].group_value(dt.column_named("b")), 3.845)
+        dt.expand_group(foo)
+        self.assertEqual(len(dt), 5)
+        self.assertEqual(dt.focus_position, 2)
+        self.assertEqual(sorted(dt[p]["a"] for p in (3, 4)), [1, 4])
+
+        dt.add_row(dict(a=5, b=1.0, c="foo"))
+        self.assertTrue(dt.groups[("foo",)].expanded)
+        self.assertAlmostEqual(dt[2].group_value(dt.column_named("b")), 4.845)
+        dt.delete_rows([2, 3])
+        self.assertEqual(list(dt.groups), [("foo",)])
+
+        dt.focus_position = 0
+        dt.keypress((80, 10), "enter")
+        self.assertEqual(len(dt), 1)
+        dt.clear_group_by()
+        self.assertEqual(len(dt), 3)
+        self.assertEqual(len(list(dt.iter_rows())), 3)
+
+    def test_group_by_search_refresh(self):
+
+        data = self.data + [dict(a=4, b=1.5, c="foo")]
+
+        class QueryDataTable(DataTable):
+
+            def query(self, sort=None, offset=None, limit=None, **kwargs):
+                return data[offset:offset+limit]
+
+            def query_result_count(self):
+                return len(data)
+
+        dt = QueryDataTable(self.columns, index="a", sort_by="c",
+                            group_by="c", limit=2)
+        dt.reset(reset_sort=True)
+        dt.load_more(None)
+        self.assertEqual(len(dt.df), 4)
+        foo = dt.groups[("foo",)]
+        # matches in collapsed groups expand them
+        pos = dt.search("1.5", column="b")
+        self.assertTrue(foo.expanded)
+        self.assertEqual(dt.get_value(pos, "a"), 4)
+        with self.assertRaises(Exception):
+            dt.get_value(2, "a")
+        dt.collapse_group(foo)
+        dt.focus_position = 0
+        pos = dt.search("fo", column="c")
+        self.assertTrue(foo.expanded)
+        self.assertEqual(pos, 3)
+        # all loaded rows are requeried, not just the visible ones
+        dt.collapse_group(foo)
+        self.assertEqual(len(dt), 3)
+        dt.refresh()
+        self.assertEqual(len(dt.df), 4)
+
+    def test_search_index(self):
+
+        index = SearchIndex(enumerate(["apple", "banana", "cherry", "Applesauce"]))
+        self.assertEqual(sorted(index.prefix("app")), [0, 3])
+        self.assertEqual(sorted(index.substring("an")), [1])
+        self.assertEqual(sorted(index.substring("sauce")), [3])
+        index.add(4, "pineapple")
+        index.remove(0)
+        self.assertEqual(sorted(index.substring("apple")), [3, 4])
+        self.assertEqual(index.prefix("app"), [3])
+        # merged in one pass, in the same order as adding them one at a time
+        index.update(enumerate(("%04d" %(i) for i in range(300, 0, -1)), 10))
+        self.assertEqual(index.prefix("000"), list(range(309, 300, -1)))
+        self.assertEqual(index.substring("0299"), [11])
+        self.assertEqual(index.prefix("app"), [3])
+
+    def test_table_search_index(self):
+
+        self.columns[1].format_fn = lambda v: "%.1f" %(v)
+        dt = DataTable(self.columns, data=self.data, index="a")
+        dt.refresh()
+        index = DataTableSearchIndex(dt, "b")
+        # matched as the column formats the values
+        self.assertEqual(index.prefix("4.8"), [2])
+        self.assertEqual(index.prefix("4.81"), [])
+        dt.df[3, "b"] = 4.75
+        index.update_rows([3])
+        self.assertEqual(sorted(index.prefix("4.8")), [2, 3])
@@ -1,5 +1,8 @@
+import asyncio
 import unittest
 
+import urwid
+
 from panwid.dropdown import *
 from orderedattrdict import AttrDict
 
@@ -68,3 +71,289 @@ class TestDropdown(unittest.TestCase):
     def test_default_value(self):
         dropdown = Dropdown(self.data, default=37)
         self.assertEqual(dropdown.selected_value, 37)
+
+    def test_lazy_items(self):
+        labels = ["item %05d" %(i) for i in range(30000)]
+        dropdown = Dropdown(lambda: labels, default="item 20000")
+        self.assertEqual(len(dropdown), 30000)
+        self.assertEqual(dropdown.selected_value, 20000)
+        self.assertEqual(dropdown.pop_up.max_item_width, 10)
+        walker = dropdown.pop_up.body
+        self.assertLess(len(walker._widgets), 10)
+        for i in range(walker.cache_size + 10):
+            walker[i]
+        self.assertEqual(len(walker._widgets), walker.cache_size)
+        self.assertEqual(walker[0].label_text, "item 00000")
+        dropdown.select_value(5)
+        self.assertEqual(dropdown.selected_label, "item 00005")
+
+    def test_select(self):
+        dropdown = Dropdown(self.data)
+        dropdown.select_label("ipsum MODI eius.")
+        self.assertEqual(dropdown.selected_value, 3)
+        with self.assertRaises(ValueError):
+            dropdown.select_label("ipsum modi eius.", case_sensitive=True)
+        dropdown.value = 37
+        self.assertEqual(dropdown.selected_label, "Dolorem porro tempora tempora.")
+        dropdown.value = "Sit modi dolor."
+        self.assertEqual(dropdown.selected_value, 31)
+
+        dropdown.set_items([("foo", 1), ("Bar", 2)], selected_value=2)
+        self.assertEqual(dropdown.selected_label, "Bar")
+        dropdown.select_label("bar")
+        self.assertEqual(dropdown.selected_value, 2)
+        with self.assertRaises(ValueError):
+            dropdown.select_label("Sit modi dolor.")
+
+    def test_geometry(self):
+        dropdown = Dropdown(self.data, border=True)
+        self.assertEqual(dropdown.pop_up.max_item_width, 42)
+        params = dropdown.get_pop_up_parameters()
+        self.assertEqual(params["overlay_width"], 44)
+        self.assertIs(dropdown.get_pop_up_parameters(), params)
+        dropdown.set_items(["a", "bb"])
+        self.assertEqual(dropdown.pop_up.max_item_width, 2)
+        self.assertEqual(dropdown.get_pop_up_parameters()["overlay_width"], 4)
+
+    def test_complete(self):
+        dropdown = Dropdown(self.data, auto_complete=True)
+        labels = list(self.data.keys())
+        pop_up = dropdown.pop_up
+        pop_up.complete_on()
+        pop_up.filter_text = "si"
+        self.assertEqual(pop_up.focus_position, labels.index("Sit aliquam dolorem."))
+        pop_up.filter_text = "sit q"
+        self.assertEqual(pop_up.focus_position, labels.index("Sit quiquia quiquia non."))
+        pop_up.complete_next()
+        self.assertEqual(pop_up.focus_position, labels.index("Sit quisquam numquam quaerat."))
+        pop_up.complete_next()
+        self.assertEqual(pop_up.focus_position, labels.index("Sit quiquia quiquia non."))
+        pop_up.complete_off()
+
+        pop_up.complete_on(anywhere=True)
+        pop_up.filter_text = "porro"
+        self.assertEqual(pop_up.focus_position, labels.index("Dolorem porro tempora tempora."))
+        pop_up.complete_prev()
+        self.assertEqual(pop_up.focus_position, labels.index("Porro voluptatem quaerat voluptatem"))
+        self.assertEqual(pop_up[pop_up.focus_position]._highlight_location, (0, 5))
+
+    def test_complete_casefold(self):
+        # "ß" casefolds to "ss", so highlights are mapped back to the label
+        dropdown = Dropdown(["Große Straße", "Grüße"], auto_complete=True)
+        pop_up = dropdown.pop_up
+        pop_up.complete_on(anywhere=True)
+        pop_up.filter_text = "strasse"
+        self.assertEqual(pop_up.focus_position, 0)
+        self.assertEqual(pop_up[0]._highlight_spans, ((6, 12),))
+        # the cached highlights are tuples, but urwid is given lists
+        self.assertEqual(
+            urwid.Text(pop_up[0].highlight_content).text, "Große Straße"
+        )
+        self.assertEqual(
+            pop_up[0].button._label.get_text()[1],
+            [("dropdown_text", 6), ("dropdown_highlight", 6)]
+        )
+        pop_up.filter_text = "üss"
+        self.assertEqual(pop_up.focus_position, 1)
+        self.assertEqual(pop_up[1]._highlight_spans, ((2, 4),))
+        pop_up.complete_off()
+
+        pop_up.complete_on(fuzzy=True)
+        pop_up.filter_text = "gßt"
+        self.assertEqual(pop_up.focus_position, 0)
+        self.assertEqual(pop_up[0]._highlight_spans, ((0, 1), (3, 4), (6, 8)))
+        pop_up.complete_off()
+
+    def test_complete_fuzzy(self):
+        dropdown = Dropdown(self.data, auto_complete=True)
+        labels = list(self.data.keys())
+        pop_up = dropdown.pop_up
+        pop_up.complete_on(fuzzy=True)
+        pop_up.filter_text = "sqn"
+        self.assertEqual(pop_up.focus_position, labels.index("Sit quisquam numquam quaerat."))
+        self.assertEqual(
+            pop_up[pop_up.focus_position]._highlight_spans,
+            ((0, 1), (4, 5), (13, 14))
+        )
+        pop_up.complete_next()
+        self.assertNotEqual(pop_up.focus_position, labels.index("Sit quisquam numquam quaerat."))
+        pop_up.complete_prev()
+        self.assertEqual(pop_up.focus_position, labels.index("Sit quisquam numquam quaerat."))
+        pop_up.filter_text = "xyz"
+        self.assertEqual(pop_up.focus_position, labels.index("Sit quisquam numquam quaerat."))
+        pop_up.complete_off()
+
+    def test_complete_filter(self):
+        dropdown = Dropdown(self.data, auto_complete=True)
+        labels = list(self.data.keys())
+        pop_up = dropdown.pop_up
+        widget = pop_up[labels.index("Neque quisquam neque.")]
+        pop_up.complete_filter()
+        pop_up.filter_text = "quisq"
+        self.assertEqual(
+            [ str(pop_up[i]) for i in range(len(pop_up)) ],
+            [ l for l in labels if "quisq" in l.lower() ]
+        )
+        self.assertEqual(pop_up.focus_position, 0)
+        # items that stay visible keep their widgets
+        self.assertIn(widget, [ pop_up[i] for i in range(len(pop_up)) ])
+        pop_up.complete_next()
+        label = str(pop_up[pop_up.focus_position])
+        pop_up.on_complete_select(pop_up)
+        self.assertEqual(len(pop_up), len(labels))
+        self.assertEqual(dropdown.selected_label, label)
+        self.assertEqual(dropdown.focus_position, labels.index(label))
+
+    def test_complete_filter_delay(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        matches = len([ l for l in self.data if "qu" in l.lower() ])
+        # filter_delay defaults to default_filter_delay, and 0 turns it off
+        for filter_delay, before in [(0.01, len(self.data)),
+                                     (None, len(self.data)),
+                                     (0, matches)]:
+            dropdown = Dropdown(self.data, auto_complete=True,
+                                filter_delay=filter_delay)
+            pop_up = dropdown.pop_up
+            pop_up.complete_filter()
+            lengths = []
+            def keypresses():
+                pop_up.filter_text = "q"
+                pop_up.filter_text = "qu"
+                lengths.append(len(pop_up))
+            loop.call_soon(keypresses)
+            loop.run_until_complete(asyncio.sleep(0.1))
+            self.assertEqual(lengths, [before])
+            self.assertEqual(len(pop_up), matches)
+            pop_up.complete_off()
+        loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_coalesce_movement(self):
+
+        def move(key, n, coalesce):
+            dropdown = Dropdown(self.data, scrollbar=True)
+            pop_up = dropdown.pop_up
+            pop_up.render((60, 10), focus=True)
+            pending = []
+            def keypresses():
+                for i in range(n):
+                    pop_up.keypress((60, 10), key)
+                pending.append(pop_up.dropdown_buttons._pending_movement)
+            if coalesce:
+                loop = asyncio.new_event_loop()
+                loop.call_soon(keypresses)
+                loop.run_until_complete(asyncio.sleep(0))
+                # all but the first are applied together once the tick ends
+                self.assertEqual(pending[0][-1], n-1)
+                self.assertEqual(pop_up.dropdown_buttons._pending_movement, None)
+                loop.close()
+            else:
+                keypresses()
+            return pop_up.focus_position, pop_up.render((60, 10), focus=True).text
+
+        for key, n in [("down", 13), ("page down", 3)]:
+            self.assertEqual(move(key, n, False), move(key, n, True))
+
+    def test_items_fn(self):
+        labels = list(self.data.keys())
+        calls = []
+        def items_fn(text, offset, limit):
+            calls.append((text, offset))
+            return [
+                (l, v) for l, v in self.data.items() if text in l.lower()
+            ][offset:offset+limit]
+
+        dropdown = Dropdown(items_fn=items_fn, items_limit=20, auto_complete=True)
+        pop_up = dropdown.pop_up
+        self.assertEqual(len(dropdown), 20)
+        pop_up.load_more()
+        pop_up.load_more()
+        pop_up.load_more()
+        self.assertEqual(len(dropdown), len(labels))
+        self.assertEqual(calls, [("", 0), ("", 20), ("", 40)])
+
+        pop_up.complete_on()
+        pop_up.filter_text = "porro"
+        self.assertEqual(
+            [ str(pop_up[i]) for i in range(len(pop_up)) ],
+            [ l for l in labels if "porro" in l.lower() ]
+        )
+        # both queries come from the cache the second time
+        count = len(calls)
+        pop_up.filter_text = ""
+        self.assertEqual(len(dropdown), len(labels))
+        pop_up.filter_text = "porro"
+        self.assertEqual(len(calls), count)
+        pop_up.complete_next()
+        label = str(pop_up[pop_up.focus_position])
+        pop_up.on_complete_select(pop_up)
+        self.assertEqual(dropdown.selected_label, label)
+        self.assertEqual(dropdown.selected_value, self.data[label])
+
+    def test_items_fn_async(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        queries = []
+        async def items_fn(text, offset, limit):
+            queries.append(text)
+            await asyncio.sleep(0.01)
+            return [ l for l in self.data if text in l.lower() ][offset:offset+limit]
+
+        dropdown = Dropdown(items_fn=items_fn, auto_complete=True)
+        pop_up = dropdown.pop_up
+        empty_height = dropdown.get_pop_up_parameters()["overlay_height"]
+        loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertEqual(len(dropdown), len(self.data))
+        # the pop-up grows to fit the items once they arrive
+        self.assertEqual(
+            dropdown.get_pop_up_parameters()["overlay_height"],
+            empty_height + pop_up.max_height
+        )
+        pop_up.complete_on()
+        def keypress(text):
+            pop_up.filter_text = text
+        loop.call_soon(keypress, "p")
+        loop.call_later(0.02, keypress, "po")
+        loop.run_until_complete(asyncio.sleep(0.2))
+        # the query waits for typing to pause, so "p" is never sent
+        self.assertEqual(queries, ["", "po"])
+        self.assertEqual(
+            [ str(pop_up[i]) for i in range(len(pop_up)) ],
+            [ l for l in self.data if "po" in l.lower() ]
+        )
+        pop_up.complete_off()
+        loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_items_fn_async_error(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        queries = []
+        async def items_fn(text, offset, limit):
+            queries.append(text)
+            if len(queries) == 2:
+                raise Exception("unavailable")
+            return [ l for l in self.data if text in l.lower() ][offset:offset+limit]
+
+        dropdown = Dropdown(items_fn=items_fn, auto_complete=True, filter_delay=0)
+        pop_up = dropdown.pop_up
+        loop.run_until_complete(asyncio.sleep(0))
+        pop_up.complete_on()
+        with self.assertLogs("panwid.dropdown", "ERROR"):
+            pop_up.filter_text = "po"
+            loop.run_until_complete(asyncio.sleep(0))
+        self.assertIsNone(pop_up._items_task)
+        self.assertEqual(len(pop_up), 0)
+        # the failed query isn't cached, so it's tried again
+        pop_up.filter_text = ""
+        pop_up.filter_text = "po"
+        loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(queries, ["", "po", "po"])
+        self.assertEqual(
+            [ str(pop_up[i]) for i in range(len(pop_up)) ],
+            [ l for l in self.data if "po" in l.lower() ]
+        )
+        pop_up.complete_off()
+        loop.close()
+        asyncio.set_event_loop(None)
@@ -0,0 +1,68 @@
+import unittest
+
+import urwid
+
+import panwid.keymap
+from panwid.keymap import *
+
+@keymapped()
+class KeymapWidget(urwid.WidgetWrap):
+
+    KEYMAP = {
+        "a": "first",
+        "b": ("add", [2]),
+        "c": "keypress a",
+    }
+
+    def __init__(self):
+        self.calls = []
+        super().__init__(urwid.SelectableIcon(""))
+
+    @keymap_command()
+    def first(self):
+        self.calls.append("first")
+
+    @keymap_command("second")
+    def second_command(self):
+        self.calls.append("second")
+
+    @keymap_command()
+    def add(self, n):
+        self.calls.append(n)
+
+
+class TestKeymap(unittest.TestCase):
+
+    def setUp(self):
+        self.keymap_global = panwid.keymap.KEYMAP_GLOBAL
+
+    def tearDown(self):
+        panwid.keymap.KEYMAP_GLOBAL = self.keymap_global
+        keymap_invalidate()
+
+    def test_dispatch(self):
+        w = KeymapWidget()
+        self.assertEqual(w.keypress((10,), "a"), None)
+        self.assertEqual(w.keypress((10,), "b"), None)
+        self.assertEqual(w.keypress((10,), "c"), "a")
+        self.assertEqual(w.keypress((10,), "d"), "d")
+        self.assertEqual(w.calls, ["first", 2])
+
+    def test_register(self):
+        w = KeymapWidget()
+        w.keypress((10,), "d")
+        w.keymap_register("d", "second")
+        self.assertEqual(w.keypress((10,), "d"), None)
+        self.assertEqual(w.calls, ["second"])
+
+    def test_global(self):
+        w = KeymapWidget()
+        w.keypress((10,), "a")
+        panwid.keymap.KEYMAP_GLOBAL = {"keymap_widget": {"x": "second"}}
+        # the global keymap replaces the widget's own for its scope
+        self.assertEqual(w.keypress((10,), "a"), "a")
+        self.assertEqual(w.keypress((10,), "x"), None)
+        panwid.keymap.KEYMAP_GLOBAL["keymap_widget"]["y"] = ("add", [3])
+        keymap_invalidate()
+        self.assertEqual(w.keypress((10,), "y"), None)
+        self.assertEqual(w.calls, ["first", "second", 3])
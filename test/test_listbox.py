@@ -0,0 +1,44 @@
+import asyncio
+import unittest
+
+import urwid
+
+from panwid.listbox import *
+
+class TestScrollingListBox(unittest.TestCase):
+
+    SIZE = (20, 10)
+
+    def move(self, labels, key, n, coalesce):
+        listbox = ScrollingListBox(
+            urwid.SimpleFocusListWalker(
+                [ urwid.SelectableIcon(l) for l in labels ]
+            ),
+            with_scrollbar=True,
+            coalesce_movement=coalesce
+        )
+        listbox.render(self.SIZE, focus=True)
+        def keypresses():
+            for i in range(n):
+                listbox.keypress(self.SIZE, key)
+        loop = asyncio.new_event_loop()
+        loop.call_soon(keypresses)
+        loop.run_until_complete(asyncio.sleep(0))
+        loop.close()
+        return listbox.focus_position, listbox.render(self.SIZE, focus=True).text
+
+    def assertMoves(self, labels):
+        for key, n in [("down", 13), ("page down", 5), ("page down", 1)]:
+            self.assertEqual(
+                self.move(labels, key, n, False),
+                self.move(labels, key, n, True)
+            )
+
+    def test_coalesce_movement(self):
+        self.assertMoves([ str(i) for i in range(200) ])
+
+    def test_coalesce_movement_multiline(self):
+        self.assertMoves([
+            str(i) if i % 3 else "%d\n%d" %(i, i)
+            for i in range(200)
+        ])